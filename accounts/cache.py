@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+from config import cache_versions
+
+
+def _version_key(user_id):
+    return f"accounts:user:v:{user_id}"
+
+
+def _user_key(user_id):
+    return f"accounts:user:{user_id}"
+
+
+def invalidate(user_id):
+    """
+    キャッシュしたユーザーを読まれないようにする
+    コミット前に別のリクエストが古い値をキャッシュし直す場合に備え、コミット後にも版を進める
+    """
+    cache_versions.bump([_version_key(user_id)])
+    cache_versions.bump_on_commit([_version_key(user_id)])
+
+
+def _session_user_id(request):
+    try:
+        return auth._get_user_session_key(request)
+    except KeyError:
+        return None
+
+
+def _verified(request, user):
+    """
+    キャッシュしたユーザーがこのセッションで使えるか（auth.get_user と同じ確認）
+    パスワード変更などでセッションのハッシュが合わない場合は False
+    """
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return False
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return False
+    user.backend = backend_path
+    return True
+
+
+def get_user(request):
+    """
+    セッションのユーザーを読み込む（版つきキャッシュに当たればDBを読まない）
+    版とユーザーは1回の get_many で読む
+    """
+    timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 0)
+    user_id = _session_user_id(request)
+    if user_id is None or not timeout:
+        return auth.get_user(request)
+
+    version_key, user_key = _version_key(user_id), _user_key(user_id)
+    found = cache.get_many([version_key, user_key])
+    version = cache_versions.get_versions([version_key], found)[version_key]
+
+    cached = found.get(user_key)
+    if cached is not None and cached[0] == version and _verified(request, cached[1]):
+        return cached[1]
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(user_key, (version, user), timeout)
+    return user
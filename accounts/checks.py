@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+CACHE_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+def _local_cache():
+    return isinstance(caches['default'], LocMemCache)
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """
+    セッションをプロセスごとのキャッシュに置くと、ログアウトが他のプロセスに反映されない
+    """
+    if settings.SESSION_ENGINE in CACHE_SESSION_ENGINES and _local_cache():
+        return [Error(
+            "SESSION_ENGINE がキャッシュを使っていますが、キャッシュがプロセスごと（LocMemCache）です",
+            hint="共有できるキャッシュを設定するか、'django.contrib.sessions.backends.db' にしてください",
+            id='accounts.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_user_cache(app_configs, **kwargs):
+    """
+    ログインユーザーのキャッシュをプロセスごとに持つと、運動の開始・終了が他のプロセスで古いまま読まれる
+    （runserver の1プロセスでは問題ないので --deploy の時だけ確認する）
+    """
+    if getattr(settings, 'USER_CACHE_TIMEOUT', 0) and _local_cache():
+        return [Error(
+            "USER_CACHE_TIMEOUT が有効ですが、キャッシュがプロセスごと（LocMemCache）です",
+            hint="共有できるキャッシュを設定するか、USER_CACHE_TIMEOUT = 0 にしてください",
+            id='accounts.E002',
+        )]
+    return []
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "ユーザー名の検索索引（FTS5トライグラム）を作り直す"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("ユーザー名の検索索引はSQLiteのみ対応しています")
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS("ユーザー名の検索索引を作り直しました"))
@@ -0,0 +1,26 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import cache
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = cache.get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware の代わりに使う
+    ログインユーザーを版つきキャッシュから読み、User.save() などで版が進んだ時だけDBを読む
+    （USER_CACHE_TIMEOUT = 0 の場合は通常どおり毎回DBを読む）
+    """
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+
+        async def auser():
+            return await sync_to_async(_get_user)(request)
+        request.auser = auser
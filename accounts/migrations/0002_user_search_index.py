@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# ユーザー名検索用のFTS5トライグラム索引（SQLiteのみ）
+# accounts_user を外部コンテンツとし、トリガーで同期する
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE accounts_user_fts USING fts5(
+        username,
+        content='accounts_user',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER accounts_user_fts_ai AFTER INSERT ON accounts_user BEGIN
+        INSERT INTO accounts_user_fts(rowid, username) VALUES (new.id, new.username);
+    END
+    """,
+    """
+    CREATE TRIGGER accounts_user_fts_ad AFTER DELETE ON accounts_user BEGIN
+        INSERT INTO accounts_user_fts(accounts_user_fts, rowid, username)
+        VALUES ('delete', old.id, old.username);
+    END
+    """,
+    """
+    CREATE TRIGGER accounts_user_fts_au AFTER UPDATE OF username ON accounts_user BEGIN
+        INSERT INTO accounts_user_fts(accounts_user_fts, rowid, username)
+        VALUES ('delete', old.id, old.username);
+        INSERT INTO accounts_user_fts(rowid, username) VALUES (new.id, new.username);
+    END
+    """,
+    "INSERT INTO accounts_user_fts(accounts_user_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS accounts_user_fts_au",
+    "DROP TRIGGER IF EXISTS accounts_user_fts_ad",
+    "DROP TRIGGER IF EXISTS accounts_user_fts_ai",
+    "DROP TABLE IF EXISTS accounts_user_fts",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:58
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLiteでは列の追加でテーブルが作り直され、検索索引のトリガーが消えるため張り直す
+search_index = import_module('accounts.migrations.0002_user_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.drop_index, search_index.create_index),
+        migrations.AddField(
+            model_name='user',
+            name='time_zone',
+            field=models.CharField(default='Asia/Tokyo', help_text='日ごとの集計（活動カレンダーなど）に使うタイムゾーン', max_length=64),
+        ),
+        migrations.RunPython(search_index.create_index, search_index.drop_index),
+    ]
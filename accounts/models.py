@@ -1,3 +1,6 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -11,6 +14,20 @@ class User(AbstractUser):
         blank=True,
         help_text="最後に運動を始めた時間"
     )
+    time_zone = models.CharField(
+        max_length=64,
+        default='Asia/Tokyo',
+        help_text="日ごとの集計（活動カレンダーなど）に使うタイムゾーン"
+    )
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    def tzinfo(self):
+        """
+        ユーザーのタイムゾーン（不正な値の場合は TIME_ZONE）
+        """
+        try:
+            return ZoneInfo(self.time_zone)
+        except (ZoneInfoNotFoundError, ValueError):
+            return ZoneInfo(settings.TIME_ZONE)
\ No newline at end of file
@@ -0,0 +1,62 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import User
+
+CONTAINS = "contains"
+PREFIX = "prefix"
+
+# トライグラム索引が使える最小の文字数
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _use_fts(query):
+    return connection.vendor == 'sqlite' and len(query) >= TRIGRAM_MIN_LENGTH
+
+
+def search_users(query, mode=CONTAINS):
+    """
+    ユーザー名で検索
+    完全一致 → 前方一致 → 部分一致 の順に並べる
+    mode=prefix の場合は前方一致のみ
+
+    3文字以上の場合はFTS5トライグラム索引で候補を絞るため、
+    ユーザー数が増えても全件走査にならない
+    """
+    users = User.objects.all()
+    if not query:
+        return users.order_by('username')
+
+    if _use_fts(query):
+        # フレーズとして渡すことで部分文字列の一致になる
+        phrase = '"' + query.replace('"', '""') + '"'
+        users = users.filter(id__in=RawSQL(
+            "SELECT rowid FROM accounts_user_fts WHERE accounts_user_fts MATCH %s",
+            [phrase],
+        ))
+        if mode == PREFIX:
+            users = users.filter(username__istartswith=query)
+    elif mode == PREFIX:
+        users = users.filter(username__istartswith=query)
+    else:
+        users = users.filter(username__icontains=query)
+
+    return users.annotate(
+        match_rank=Case(
+            When(username__iexact=query, then=Value(0)),
+            When(username__istartswith=query, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('match_rank', 'username')
+
+
+def rebuild_index():
+    """
+    ユーザー名の検索索引を作り直す
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO accounts_user_fts(accounts_user_fts) VALUES ('rebuild')")
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from . import cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    """
+    ユーザーの保存・削除でキャッシュしたログインユーザーを破棄
+    """
+    if raw:
+        return
+    cache.invalidate(instance.pk)
@@ -1,3 +1,50 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .checks import check_session_cache
+from .models import User
+
+
+# パスワードのハッシュ化を速くする
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.user.set_password('old-password')
+        self.user.save()
+        self.client.force_login(self.user)
+        self.url = reverse('session_state_json')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        return response, len(context.captured_queries)
+
+    def test_warm_cache_reads_only_the_session(self):
+        self.get()
+        response, queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        # プロセスごとのキャッシュではセッションはDBから読む
+        self.assertEqual(queries, 1)
+
+    def test_session_in_local_cache_fails_check(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.assertEqual([error.id for error in check_session_cache(None)], ['accounts.E001'])
+        self.assertEqual(check_session_cache(None), [])
+
+    def test_session_update_is_visible(self):
+        self.get()
+        self.client.post(reverse('start_session_json'))
+
+        response, _ = self.get()
+        self.assertTrue(response.json()['exercising'])
+
+    def test_password_change_logs_out(self):
+        self.get()
+        self.user.set_password('new-password')
+        self.user.save()
+
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _resolve(key, found):
+    """
+    get_many の結果から版を取り出す（なければ作る）
+    """
+    version = found.get(key)
+    if version is None:
+        # 追い出された後に古い版と重ならないよう時刻から作る
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_versions(keys, found=None):
+    """
+    版のキー → 版（1回の get_many でまとめて読む）
+    found: 呼び出し元が他の値と一緒に get_many した結果（版のキーを含む）
+    """
+    keys = list(keys)
+    if found is None:
+        found = cache.get_many(keys)
+    return {key: _resolve(key, found) for key in keys}
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump(keys):
+    """
+    版を進めて、古い版のキーで保存したキャッシュを読まれないようにする
+    """
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_on_commit(keys):
+    keys = list(keys)
+    transaction.on_commit(lambda: bump(keys))
@@ -0,0 +1,44 @@
+from django.conf import settings
+
+from . import cache_versions
+
+# テンプレート断片の種類（ユーザーごとに版を持つ）
+RECORDS = "records"    # 自分の運動記録一覧
+PROFILE = "profile"    # ログインユーザー情報
+FEED = "feed"          # フレンドの運動記録一覧
+
+
+def _version_key(kind, user_id):
+    return f"fragment:v:{kind}:{user_id}"
+
+
+def versions(user_id, kinds):
+    """
+    ユーザーの断片キャッシュの版（{% cache %} の vary_on に渡す）
+    1回の get_many でまとめて読む
+    """
+    keys = {_version_key(kind, user_id): kind for kind in kinds}
+    return {keys[key]: version for key, version in cache_versions.get_versions(keys).items()}
+
+
+def bump(kind, user_ids):
+    """
+    版を進めて、古い断片を読まれないようにする
+    """
+    cache_versions.bump(_version_key(kind, user_id) for user_id in user_ids)
+
+
+def bump_on_commit(kind, user_ids):
+    cache_versions.bump_on_commit(_version_key(kind, user_id) for user_id in user_ids)
+
+
+def context(user, *kinds):
+    """
+    断片キャッシュを使うテンプレートに渡す値
+    fragment_ttl: 保持秒数（FRAGMENT_CACHE_TIMEOUT = 0 で無効）
+    fragment_versions: 種類 → 版
+    """
+    return {
+        'fragment_ttl': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 0),
+        'fragment_versions': versions(user.pk, kinds),
+    }
@@ -0,0 +1,154 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('config.queries')
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# True の間に発行したSQLはリクエストの件数に数えない
+_paused = ContextVar('query_collector_paused', default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    ビューのSQL発行数が QUERY_BUDGETS の上限を超えた
+    """
+
+
+@contextmanager
+def uncounted():
+    """
+    この中で発行したSQLをリクエストの件数・上限から除く
+    （コミット直後にリクエストの中で実行するジョブなど、ビュー自体の処理ではないもの）
+    """
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def fingerprint(sql):
+    """
+    値の違いを無視したSQLの形（同じ形のクエリが何度も出ていればN+1の疑い）
+    """
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _LITERALS.sub("?", sql)
+
+
+class QueryCollector:
+    """
+    connection.execute_wrapper に渡してSQLの件数と時間を記録する
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if _paused.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common()
+            if count > 1
+        ]
+
+
+def _collect(collector):
+    """
+    すべてのDB接続のSQLを collector に記録する
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(collector))
+    return stack
+
+
+class QueryInstrumentationMiddleware:
+    """
+    リクエストごとのSQL発行数・DB時間・重複クエリを記録する（QUERY_INSTRUMENTATION = True で有効）
+    - Server-Timing ヘッダーに db の時間と件数を出す
+    - config.queries ロガーにJSONで1行出す
+    - QUERY_BUDGETS（URL名 → 上限件数）を超えた場合、QUERY_BUDGET_RAISE なら例外にする
+
+    ストリーミングのレスポンス（エクスポートなど）は本文を読み終えた時にログと上限の確認を行う
+    （Server-Timing は本文より先に送るので、本文を作る前までの分になる）
+    非同期のストリーミング（ライブ配信）の本文は対象外
+    uncounted() の中のSQL（JOBS_EAGER でコミット直後に実行するジョブ）も数えない
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        with _collect(collector):
+            response = self.get_response(request)
+
+        db_ms = collector.duration * 1000
+        response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{collector.count} queries"'
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(request, response, collector, response.streaming_content)
+        else:
+            self.finish(request, response, collector)
+        return response
+
+    def stream(self, request, response, collector, chunks):
+        """
+        本文の各部分を作る間のSQLも数える
+        """
+        chunks = iter(chunks)
+        while True:
+            with _collect(collector):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+        self.finish(request, response, collector)
+
+    def finish(self, request, response, collector):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        duplicates = collector.duplicates()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_ms': round(collector.duration * 1000, 1),
+            'duplicates': duplicates,
+        }, ensure_ascii=False))
+
+        self.check_budget(view_name, collector, duplicates)
+
+    def check_budget(self, view_name, collector, duplicates):
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is None or collector.count <= budget:
+            return
+        message = f"{view_name}: {collector.count}件のSQLを発行しました（上限 {budget}件）"
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message, duplicates)
+        logger.warning(message)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +26,9 @@ SECRET_KEY = 'django-insecure-#8i3g8j1qci62+vvjn1(#wprmdryjvr*mfi%wk(6ob6ze%d_@y
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# manage.py test で実行中か（テスト中は DEBUG が False になるため、DEBUG の代わりに使う設定がある）
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 ALLOWED_HOSTS = []
 
 
@@ -42,14 +46,19 @@ INSTALLED_APPS = [
     'accounts',
     'friend',
     'exerciseRecord',
+    'feed',
+    'stats',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # ログインユーザーを版つきキャッシュから読む（AuthenticationMiddleware の代わり）
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,13 +69,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # テンプレートの読み込み・解析結果をプロセス内に保持する（本番でリクエストごとに解析し直さない）
+            # DEBUG = True の間は runserver がテンプレートの変更を検知して保持分を捨てる
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -81,6 +97,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # run_worker のスレッドと同時に書き込むため、ロック待ちを長めにし
+        # トランザクション開始時に書き込みロックを取る（途中での昇格失敗を避ける）
+        # transaction.atomic() のブロックだけが対象で、それ以外のクエリは自動コミットのまま
+        # （このアプリの atomic() はすべて書き込みを含むため、読み込みだけのリクエストには影響しない）
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+
+# Cache
+# 複数プロセスで動かす場合は共有できるバックエンドにする（フレンド・ランキング等のキャッシュの版を共有するため）
+# 例: 'django.core.cache.backends.filebased.FileBasedCache' + 'LOCATION': BASE_DIR / 'cache'
+#     'django.core.cache.backends.db.DatabaseCache' + 'LOCATION': 'cache_table'（manage.py createcachetable）
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'team12',
     }
 }
 
@@ -125,4 +162,79 @@ AUTH_USER_MODEL = 'accounts.User'
 
 LOGIN_URL = '/workouts/accounts/login/'
 LOGIN_REDIRECT_URL = "index"
-LOGOUT_REDIRECT_URL = "index"
\ No newline at end of file
+LOGOUT_REDIRECT_URL = "index"
+
+
+# キャッシュを複数プロセスで共有できるか（LocMemCache はプロセスごと）
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# 共有キャッシュがある場合、セッションはキャッシュから読み、書き込みはDBにも行う（キャッシュが消えてもログアウトにならない）
+# プロセスごとのキャッシュでは、別プロセスでのログアウトが反映されないためDBだけを使う
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db'
+)
+
+# ログインユーザーのキャッシュ保持秒数（accounts.middleware.CachedAuthenticationMiddleware、0 で無効）
+# User.save() と運動開始・終了で版を進めて破棄する
+# プロセスごとのキャッシュでは別プロセスの更新が見えないため、runserver 以外では共有キャッシュにする
+# （manage.py check --deploy でエラーになる）
+USER_CACHE_TIMEOUT = 60 * 5
+
+# テンプレート断片キャッシュの保持秒数（config.fragments、0 で無効）
+# 内容は版で破棄するので、フレンドのユーザー名変更などが反映されるまでの上限になる
+FRAGMENT_CACHE_TIMEOUT = 60 * 10
+
+# ジョブ（jobs アプリ、フィードの展開・候補の更新など）をワーカーを待たずに実行するか
+# True: 登録したトランザクションのコミット直後にそのリクエストの中で実行する（runserver だけで動かす開発用）
+# False: manage.py run_worker を別プロセスで動かして実行する（本番）
+JOBS_EAGER = DEBUG
+
+# SQL発行数の計測（config.middleware.QueryInstrumentationMiddleware）
+# True にするとリクエストごとの件数・DB時間を Server-Timing ヘッダーとログに出す
+# 開発中とテスト中は有効にして、下の上限を超えたビューを見つける
+QUERY_INSTRUMENTATION = DEBUG or TESTING
+
+# URL名ごとのSQL発行数の上限（セッション・ユーザーの読み込みを含む）
+QUERY_BUDGETS = {
+    'index': 6,
+    'exercise_records_json': 6,
+    # 終了のPOSTは運動記録の作成に伴う集計の更新（初回は行の作成、SAVEPOINTを含む）まで数える
+    'exercising': 24,
+    'post_exercise': 8,
+    'friends_exercise_records': 6,
+    'friend:user_search': 8,
+    'friend:friends_list': 6,
+    'friend:friend_requests': 6,
+    'friend:sent_requests': 6,
+    'stats:stats': 8,
+    'stats:leaderboard': 8,
+}
+
+# 上限を超えた場合に例外にするか（False の場合は警告ログのみ）
+QUERY_BUDGET_RAISE = DEBUG or TESTING
+
+# フレンドの運動状況のライブ配信（feed.views.friend_activity_stream）
+# 複数プロセスで動かす場合は同じインターフェースの外部ブローカーに差し替える
+LIVE_BROKER = 'feed.pubsub.InProcessBroker'
+LIVE_MAX_CONNECTIONS = 1000
+LIVE_MAX_CONNECTIONS_PER_USER = 3
+LIVE_HEARTBEAT_SECONDS = 15
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'config.queries': {
+            'handlers': ['console'],
+            # テスト中はリクエストごとの行を出さず、上限超えの警告だけ出す
+            'level': 'WARNING' if TESTING else 'INFO',
+            'propagate': False,
+        },
+    },
+}
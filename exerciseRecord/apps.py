@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ExerciserecordConfig(AppConfig):
     name = 'exerciseRecord'
+
+    def ready(self):
+        from . import signals  # noqa: F401
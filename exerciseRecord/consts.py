@@ -1,2 +1,15 @@
 MAX_RATE = 5
-ITEM_PER_PAGE = 2
\ No newline at end of file
+# 運動履歴の1ページあたりの件数
+ITEM_PER_PAGE = 20
+# エクスポート時に1回で読み込む件数
+EXPORT_CHUNK_SIZE = 2000
+# インポート時に1回の bulk_create で作成する件数
+IMPORT_CHUNK_SIZE = 500
+# 日記検索の1ページあたりの件数
+DIARY_SEARCH_PAGE_SIZE = 20
+# オフライン中に記録した運動をまとめて送る時の1回あたりの上限件数
+SYNC_MAX_SESSIONS = 100
+# 1回の運動として受け付ける最長の時間（分）
+SESSION_MAX_MINUTES = 24 * 60
+# 端末の時計のずれとして許容する秒数（これより未来の終了時刻は受け付けない）
+CLOCK_SKEW_SECONDS = 5 * 60
@@ -0,0 +1,103 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .consts import EXPORT_CHUNK_SIZE
+from .models import ExerciseRecord
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = (CSV, JSONL)
+
+EXPORT_FIELDS = (
+    'id',
+    'user__username',
+    'exercise_start_time',
+    'exercise_end_time',
+    'duration_minutes',
+    'diary',
+    'created_at',
+)
+HEADER = ('id', 'username', 'exercise_start_time', 'exercise_end_time', 'duration_minutes', 'diary', 'created_at')
+
+
+class _Echo:
+    """
+    csv.writer の書き込み先（書いた行をそのまま返す）
+    """
+    def write(self, value):
+        return value
+
+
+def parse_date(value, end=False):
+    """
+    YYYY-MM-DD をその日の開始（end=Trueなら翌日の開始）の日時に変換
+    """
+    day = datetime.strptime(value, "%Y-%m-%d").date()
+    moment = timezone.make_aware(datetime.combine(day, time.min))
+    if end:
+        moment += timedelta(days=1)
+    return moment
+
+
+def export_queryset(user_ids=None, since=None, until=None):
+    """
+    エクスポート対象の運動記録
+    since 以上・until 未満の exercise_start_time で絞り込む
+    """
+    records = ExerciseRecord.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+    if since is not None:
+        records = records.filter(exercise_start_time__gte=since)
+    if until is not None:
+        records = records.filter(exercise_start_time__lt=until)
+    return records.order_by('id').values_list(*EXPORT_FIELDS)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def iter_lines(records, fmt=CSV):
+    """
+    運動記録を1行ずつ文字列で返す
+    iterator(chunk_size) で読むのでメモリ使用量は件数に依存しない
+    """
+    rows = (
+        (pk, username, _iso(start), _iso(end), minutes, diary, _iso(created_at))
+        for pk, username, start, end, minutes, diary, created_at
+        in records.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    if fmt == JSONL:
+        for row in rows:
+            yield json.dumps(dict(zip(HEADER, row)), ensure_ascii=False) + "\n"
+        return
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def gzip_chunks(lines, flush_bytes=64 * 1024):
+    """
+    文字列の行をgzip圧縮しながらバイト列のチャンクで返す
+    """
+    compressor = zlib.compressobj(wbits=31)  # 31: gzipヘッダー付き
+    pending = 0
+    for line in lines:
+        data = line.encode()
+        pending += len(data)
+        chunk = compressor.compress(data)
+        if chunk:
+            yield chunk
+        if pending >= flush_bytes:
+            chunk = compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+            if chunk:
+                yield chunk
+    yield compressor.flush()
@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from .consts import IMPORT_CHUNK_SIZE
+from .models import ExerciseRecord
+from .signals import records_bulk_created
+
+CSV = "csv"
+JSONL = "jsonl"
+FORMATS = (CSV, JSONL)
+
+
+def read_rows(text, fmt=CSV):
+    """
+    CSV（ヘッダー行あり）/ JSONL のテキストを (行番号, 辞書) で返す
+    """
+    if fmt == JSONL:
+        for line_no, line in enumerate(io.StringIO(text), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_no, row
+        return
+
+    reader = csv.DictReader(io.StringIO(text))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def parse_time(value):
+    if not value:
+        raise ValueError("日時がありません")
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise ValueError(f"日時の形式が不正です: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _build_record(row, user_id):
+    """
+    1行分を検証して ExerciseRecord を作る（保存はしない）
+    """
+    start_time = parse_time(row.get('exercise_start_time'))
+    end_time = parse_time(row.get('exercise_end_time'))
+    if end_time <= start_time:
+        raise ValueError("終了時刻は開始時刻より後にしてください")
+    return ExerciseRecord(
+        user_id=user_id,
+        exercise_start_time=start_time,
+        exercise_end_time=end_time,
+        duration_minutes=ExerciseRecord.calculate_duration(start_time, end_time),
+        diary=row.get('diary') or '',
+    )
+
+
+def _resolve_users(rows, default_user):
+    """
+    username 列のユーザー名をIDに変換（まとめて1回のクエリ）
+    """
+    usernames = {row.get('username') for _, row in rows if isinstance(row, dict) and row.get('username')}
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+
+    def resolve(row):
+        if not isinstance(row, dict):
+            raise ValueError("行の形式が不正です")
+        username = row.get('username')
+        if default_user is not None:
+            if username and username != default_user.username:
+                raise ValueError("他のユーザーの記録はインポートできません")
+            return default_user.pk
+        if not username:
+            raise ValueError("username がありません")
+        if username not in user_ids:
+            raise ValueError(f"ユーザーが見つかりません: {username}")
+        return user_ids[username]
+
+    return resolve
+
+
+def _insert_chunk(records):
+    """
+    既存の記録と重複しないものだけを1回の bulk_create で作成
+    戻り値: (作成した記録, 重複件数)
+    """
+    existing = set()
+    by_user = {}
+    for record in records:
+        by_user.setdefault(record.user_id, []).append(record.exercise_start_time)
+    for user_id, start_times in by_user.items():
+        existing.update(
+            (user_id, start_time)
+            for start_time in ExerciseRecord.objects.filter(
+                user_id=user_id, exercise_start_time__in=start_times
+            ).values_list('exercise_start_time', flat=True)
+        )
+
+    new_records = []
+    for record in records:
+        key = (record.user_id, record.exercise_start_time)
+        if key in existing:
+            continue
+        existing.add(key)
+        new_records.append(record)
+
+    with transaction.atomic():
+        created = ExerciseRecord.objects.bulk_create(new_records)
+        # auto_now_add で取り込んだ時刻になるので、運動を終えた時刻に揃える
+        # （履歴・タイムラインに過去の記録が最新として並ばないように）
+        for record in created:
+            record.created_at = record.exercise_end_time
+        ExerciseRecord.objects.bulk_update(created, ['created_at'])
+        # タイムライン・集計などを同じトランザクションで更新
+        records_bulk_created.send(sender=ExerciseRecord, records=created)
+    return created, len(records) - len(created)
+
+
+def import_records(rows, user=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    運動記録をまとめてインポート
+    user を指定した場合はその本人の記録として扱い、省略時は username 列で振り分ける
+    (user, exercise_start_time) が同じ記録は重複として作成しない
+
+    戻り値: {'created': 件数, 'duplicates': 件数, 'errors': [{'line': 行番号, 'error': 内容}]}
+    """
+    rows = list(rows)
+    resolve = _resolve_users(rows, user)
+    result = {'created': 0, 'duplicates': 0, 'errors': []}
+
+    chunk = []
+    for line_no, row in rows:
+        try:
+            chunk.append(_build_record(row, resolve(row)))
+        except ValueError as e:
+            result['errors'].append({'line': line_no, 'error': str(e)})
+            continue
+        if len(chunk) >= chunk_size:
+            _flush(chunk, result)
+            chunk = []
+    if chunk:
+        _flush(chunk, result)
+    return result
+
+
+def _flush(chunk, result):
+    try:
+        created, duplicates = _insert_chunk(chunk)
+    except IntegrityError:
+        # 同時に同じ記録がインポートされた場合は重複を除いてやり直す
+        created, duplicates = _insert_chunk(chunk)
+    result['created'] += len(created)
+    result['duplicates'] += duplicates
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from exerciseRecord.export import CSV, FORMATS, export_queryset, gzip_chunks, iter_lines, parse_date
+
+
+class Command(BaseCommand):
+    help = "運動記録をCSV / JSONLでエクスポートする（件数に関わらずメモリ使用量は一定）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default=CSV, dest='fmt')
+        parser.add_argument('--since', help="この日以降（YYYY-MM-DD）")
+        parser.add_argument('--until', help="この日まで（YYYY-MM-DD）")
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="対象ユーザー名（複数指定可、省略時は全ユーザー）",
+        )
+        parser.add_argument('--gzip', action='store_true', help="gzip圧縮して出力")
+        parser.add_argument('--output', '-o', help="出力先ファイル（省略時は標準出力）")
+
+    def handle(self, *args, fmt, since, until, usernames, gzip, output, **options):
+        try:
+            since = parse_date(since) if since else None
+            until = parse_date(until, end=True) if until else None
+        except ValueError:
+            raise CommandError("日付は YYYY-MM-DD で指定してください")
+
+        user_ids = None
+        if usernames:
+            user_ids = list(User.objects.filter(username__in=usernames).values_list('pk', flat=True))
+
+        lines = iter_lines(export_queryset(user_ids, since, until), fmt)
+
+        if gzip:
+            chunks = gzip_chunks(lines)
+            stream = open(output, 'wb') if output else sys.stdout.buffer
+        else:
+            chunks = lines
+            stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            if output:
+                stream.close()
+            else:
+                stream.flush()
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from exerciseRecord import importer
+from exerciseRecord.consts import IMPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "CSV / JSONLから運動記録をまとめてインポートする"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="入力ファイル（- で標準入力）")
+        parser.add_argument('--format', choices=importer.FORMATS, dest='fmt', help="省略時は拡張子から判断")
+        parser.add_argument('--user', help="全行をこのユーザーの記録として扱う（省略時は username 列）")
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, path, fmt, user, chunk_size, **options):
+        if fmt is None:
+            fmt = importer.JSONL if path.endswith(('.jsonl', '.ndjson')) else importer.CSV
+
+        default_user = None
+        if user:
+            default_user = User.objects.filter(username=user).first()
+            if default_user is None:
+                raise CommandError(f"ユーザーが見つかりません: {user}")
+
+        if path == '-':
+            text = sys.stdin.read()
+        else:
+            with open(path, encoding='utf-8-sig') as f:
+                text = f.read()
+
+        result = importer.import_records(
+            importer.read_rows(text, fmt),
+            user=default_user,
+            chunk_size=chunk_size,
+        )
+
+        for error in result['errors']:
+            self.stderr.write(f"{error['line']}行目: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"作成: {result['created']}件 / 重複: {result['duplicates']}件 / エラー: {len(result['errors'])}件"
+        ))
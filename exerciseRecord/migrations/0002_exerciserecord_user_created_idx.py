@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exerciseRecord', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exerciserecord',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='exercise_user_created_idx'),
+        ),
+    ]
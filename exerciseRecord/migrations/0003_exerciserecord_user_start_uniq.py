@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_records(apps, schema_editor):
+    """
+    運動終了の二重送信で作られた同じ開始時刻の記録を、最初の1件を残して削除
+    """
+    ExerciseRecord = apps.get_model('exerciseRecord', 'ExerciseRecord')
+    duplicates = (
+        ExerciseRecord.objects
+        .values('user_id', 'exercise_start_time')
+        .annotate(first_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        ExerciseRecord.objects.filter(
+            user_id=row['user_id'],
+            exercise_start_time=row['exercise_start_time'],
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exerciseRecord', '0002_exerciserecord_user_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exerciserecord',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise_start_time'), name='exercise_user_start_uniq'),
+        ),
+    ]
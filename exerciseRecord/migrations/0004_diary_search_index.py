@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# 運動日記の全文検索用のFTS5トライグラム索引（SQLiteのみ）
+# トライグラムなので日本語のように単語の区切りがない文章でも部分一致で検索できる
+# exerciseRecord_exerciserecord を外部コンテンツとし、トリガーで同期する
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE exerciserecord_diary_fts USING fts5(
+        diary,
+        content='exerciseRecord_exerciserecord',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER exerciserecord_diary_fts_ai AFTER INSERT ON exerciseRecord_exerciserecord BEGIN
+        INSERT INTO exerciserecord_diary_fts(rowid, diary) VALUES (new.id, new.diary);
+    END
+    """,
+    """
+    CREATE TRIGGER exerciserecord_diary_fts_ad AFTER DELETE ON exerciseRecord_exerciserecord BEGIN
+        INSERT INTO exerciserecord_diary_fts(exerciserecord_diary_fts, rowid, diary)
+        VALUES ('delete', old.id, old.diary);
+    END
+    """,
+    """
+    CREATE TRIGGER exerciserecord_diary_fts_au AFTER UPDATE OF diary ON exerciseRecord_exerciserecord BEGIN
+        INSERT INTO exerciserecord_diary_fts(exerciserecord_diary_fts, rowid, diary)
+        VALUES ('delete', old.id, old.diary);
+        INSERT INTO exerciserecord_diary_fts(rowid, diary) VALUES (new.id, new.diary);
+    END
+    """,
+    "INSERT INTO exerciserecord_diary_fts(exerciserecord_diary_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS exerciserecord_diary_fts_au",
+    "DROP TRIGGER IF EXISTS exerciserecord_diary_fts_ad",
+    "DROP TRIGGER IF EXISTS exerciserecord_diary_fts_ai",
+    "DROP TABLE IF EXISTS exerciserecord_diary_fts",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exerciseRecord', '0003_exerciserecord_user_start_uniq'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -9,6 +9,16 @@ class ExerciseRecord(models.Model):
     diary = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # 同じ開始時刻の記録は重複とみなす（インポートの重複排除用）
+            models.UniqueConstraint(fields=['user', 'exercise_start_time'], name='exercise_user_start_uniq'),
+        ]
+        indexes = [
+            # 運動履歴のカーソルページネーション用
+            models.Index(fields=['user', '-created_at', '-id'], name='exercise_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.created_at}"
 
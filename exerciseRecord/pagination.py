@@ -0,0 +1,85 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+OLDER = "older"
+NEWER = "newer"
+
+
+def encode_cursor(record):
+    """
+    (created_at, id) をURLに載せられるカーソル文字列に変換
+    """
+    raw = f"{record.created_at.isoformat()}|{record.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列を (created_at, id) に戻す
+    不正なカーソルの場合は None を返す
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_queryset(queryset, position, direction, per_page):
+    """
+    position（(created_at, id) か None）から direction へ per_page + 1 件を取得するqueryset
+    NEWER は古い順、OLDER は新しい順に並ぶ
+    """
+    if position is not None:
+        created_at, pk = position
+        if direction == NEWER:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+    if direction == NEWER:
+        return queryset.order_by("created_at", "id")[:per_page + 1]
+    return queryset.order_by("-created_at", "-id")[:per_page + 1]
+
+
+def paginate_by_cursor(queryset, cursor=None, direction=OLDER, per_page=20):
+    """
+    (created_at, id) をキーにしたカーソルページネーション
+    OFFSET を使わないため、どれだけ古いページでも (user, created_at, id) の
+    インデックスを範囲検索するだけで済む
+
+    戻り値: (records, older_cursor, newer_cursor)
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        direction = OLDER
+
+    records = list(page_queryset(queryset, position, direction, per_page))
+    if direction == NEWER and len(records) <= per_page:
+        # 最新まで戻った（カーソルの記録が削除された場合を含む）ので最初のページを返す
+        return paginate_by_cursor(queryset, per_page=per_page)
+    if direction == NEWER:
+        # 新しい方向は昇順で取得してから並べ直す
+        has_more = len(records) > per_page
+        records = records[:per_page][::-1]
+        has_newer, has_older = has_more, True
+    else:
+        has_more = len(records) > per_page
+        records = records[:per_page]
+        has_newer, has_older = position is not None, has_more
+
+    if not records:
+        return records, None, None
+
+    older_cursor = encode_cursor(records[-1]) if has_older else None
+    newer_cursor = encode_cursor(records[0]) if has_newer else None
+    return records, older_cursor, newer_cursor
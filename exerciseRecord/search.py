@@ -0,0 +1,70 @@
+from django.db import connection
+from django.db.models import Q
+
+from .models import ExerciseRecord
+
+# トライグラム索引が使える最小の文字数
+TRIGRAM_MIN_LENGTH = 3
+
+_FTS_SQL = """
+    SELECT r.id
+    FROM exerciserecord_diary_fts AS f
+    JOIN "exerciseRecord_exerciserecord" AS r ON r.id = f.rowid
+    WHERE exerciserecord_diary_fts MATCH %s AND r.user_id IN ({placeholders})
+    ORDER BY f.rank, r.created_at DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def _terms(query):
+    return [term for term in query.split() if term]
+
+
+def _use_fts(terms):
+    return connection.vendor == 'sqlite' and all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms)
+
+
+def _match_expression(terms):
+    # 各語をフレーズとして AND で繋ぐ（部分文字列の一致になる）
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_diaries(query, user_ids, offset, limit):
+    """
+    運動日記を全文検索（user_ids の記録だけが対象）
+    関連度（bm25）の高い順、同じなら新しい順
+    戻り値: ExerciseRecord のリスト（user を読み込み済み）
+    """
+    terms = _terms(query)
+    if not terms or not user_ids:
+        return []
+
+    if not _use_fts(terms):
+        # 3文字未満の語はトライグラムで引けないので、対象ユーザーの記録だけを LIKE で探す
+        condition = Q()
+        for term in terms:
+            condition &= Q(diary__icontains=term)
+        return list(
+            ExerciseRecord.objects
+            .filter(condition, user_id__in=user_ids)
+            .select_related('user')
+            .order_by('-created_at', '-id')[offset:offset + limit]
+        )
+
+    sql = _FTS_SQL.format(placeholders=", ".join(["%s"] * len(user_ids)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_match_expression(terms), *user_ids, limit, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+
+    records = ExerciseRecord.objects.select_related('user').in_bulk(ids)
+    return [records[pk] for pk in ids if pk in records]
+
+
+def rebuild_index():
+    """
+    運動日記の検索索引を作り直す
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO exerciserecord_diary_fts(exerciserecord_diary_fts) VALUES ('rebuild')")
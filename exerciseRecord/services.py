@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import cache as user_cache
+from accounts.models import User
+from . import importer
+from .consts import CLOCK_SKEW_SECONDS, SESSION_MAX_MINUTES
+from .models import ExerciseRecord
+from .signals import session_started
+
+
+def own_records(user):
+    """
+    ユーザー本人の運動記録（ホーム画面・JSON版の一覧）
+    """
+    return ExerciseRecord.objects.filter(user=user)
+
+
+def start_session(user, now=None):
+    """
+    運動を開始する
+    last_exercise_time が空の場合だけ1回のUPDATEで設定する（二重送信しても開始時刻は変わらない）
+    戻り値: 開始時刻
+    """
+    now = now or timezone.now()
+    started = User.objects.filter(pk=user.pk, last_exercise_time__isnull=True).update(
+        last_exercise_time=now
+    )
+    if started:
+        # queryset.update では post_save が送られないので、キャッシュしたログインユーザーを直接破棄
+        user_cache.invalidate(user.pk)
+        user.last_exercise_time = now
+        session_started.send(sender=User, user=user, started_at=now)
+    else:
+        user.last_exercise_time = (
+            User.objects.filter(pk=user.pk).values_list('last_exercise_time', flat=True).first()
+        )
+    return user.last_exercise_time
+
+
+def end_session(user, now=None):
+    """
+    運動を終了して運動記録を作成する
+    読み込み済みの開始時刻のままの場合だけ1回のUPDATEで解除するので、
+    同時に終了が送られても記録は1件しか作られない
+    戻り値: 作成した運動記録（運動中でない・既に終了済みの場合は None）
+    """
+    start_time = user.last_exercise_time
+    if start_time is None:
+        return None
+
+    end_time = now or timezone.now()
+    with transaction.atomic():
+        ended = User.objects.filter(pk=user.pk, last_exercise_time=start_time).update(
+            last_exercise_time=None
+        )
+        if not ended:
+            user.last_exercise_time = None
+            return None
+        user_cache.invalidate(user.pk)
+        record = ExerciseRecord.objects.create(
+            user=user,
+            exercise_start_time=start_time,
+            exercise_end_time=end_time,
+            duration_minutes=ExerciseRecord.calculate_duration(start_time, end_time),
+            diary=''
+        )
+    user.last_exercise_time = None
+    return record
+
+
+def _check_session(session, now):
+    """
+    端末から送られた1回分の運動を検証（日時の形式・前後関係は importer で確認する）
+    """
+    if not isinstance(session, dict):
+        raise ValueError("形式が不正です")
+    start_time = importer.parse_time(session.get('exercise_start_time'))
+    end_time = importer.parse_time(session.get('exercise_end_time'))
+    if end_time > now + timedelta(seconds=CLOCK_SKEW_SECONDS):
+        raise ValueError("終了時刻が未来になっています")
+    if end_time - start_time > timedelta(minutes=SESSION_MAX_MINUTES):
+        raise ValueError(f"1回の運動は{SESSION_MAX_MINUTES // 60}時間までです")
+    return start_time
+
+
+def sync_sessions(user, sessions, now=None):
+    """
+    オフライン中に端末で記録した運動をまとめて登録する
+    (user, 開始時刻) のユニーク制約で重複を除くので、同じ内容を何度送っても記録は1件
+    サーバー側で運動中のままになっている開始時刻が含まれていれば運動中を解除する
+
+    戻り値: importer.import_records と同じ（line は sessions の何件目か）
+    """
+    now = now or timezone.now()
+    rows = []
+    start_times = []
+    errors = []
+    for index, session in enumerate(sessions, start=1):
+        try:
+            start_times.append(_check_session(session, now))
+        except ValueError as e:
+            errors.append({'line': index, 'error': str(e)})
+            continue
+        rows.append((index, {
+            'exercise_start_time': session['exercise_start_time'],
+            'exercise_end_time': session['exercise_end_time'],
+            'diary': session.get('diary') or '',
+        }))
+
+    with transaction.atomic():
+        result = importer.import_records(rows, user=user)
+        if start_times and User.objects.filter(pk=user.pk, last_exercise_time__in=start_times).update(
+            last_exercise_time=None
+        ):
+            user_cache.invalidate(user.pk)
+            user.last_exercise_time = None
+    result['errors'] = sorted(errors + result['errors'], key=lambda error: error['line'])
+    return result
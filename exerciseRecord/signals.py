@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from accounts.models import User
+from config import fragments
+
+# bulk_create で運動記録をまとめて作成した後に送る（post_save は送られないため）
+# records: 作成した ExerciseRecord のリスト
+records_bulk_created = Signal()
+
+# 運動を開始した時に送る
+# user: 開始したユーザー, started_at: 開始時刻
+session_started = Signal()
+
+
+@receiver(post_save, sender='exerciseRecord.ExerciseRecord')
+@receiver(post_delete, sender='exerciseRecord.ExerciseRecord')
+def bump_records_fragment(sender, instance, raw=False, **kwargs):
+    """
+    運動記録の作成・日記投稿・削除で運動記録一覧の断片キャッシュを破棄
+    """
+    if raw:
+        return
+    fragments.bump_on_commit(fragments.RECORDS, [instance.user_id])
+
+
+@receiver(records_bulk_created)
+def bump_records_fragment_on_bulk_create(sender, records, **kwargs):
+    fragments.bump_on_commit(fragments.RECORDS, {record.user_id for record in records})
+
+
+@receiver(post_save, sender=User)
+def bump_profile_fragment(sender, instance, raw=False, **kwargs):
+    """
+    ユーザー情報の変更でログインユーザー情報の断片キャッシュを破棄
+    """
+    if raw:
+        return
+    fragments.bump_on_commit(fragments.PROFILE, [instance.pk])
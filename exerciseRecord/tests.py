@@ -1,3 +1,389 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from friend.models import Friend
+from . import importer
+from .consts import SYNC_MAX_SESSIONS
+from .models import ExerciseRecord
+from .pagination import NEWER, decode_cursor, encode_cursor, paginate_by_cursor
+from .search import search_diaries
+from .services import end_session, start_session
+
+
+def create_record(user, start, minutes=30, diary=''):
+    """
+    start から minutes 分の運動記録を作る
+    """
+    return ExerciseRecord.objects.create(
+        user=user, diary=diary, duration_minutes=minutes,
+        exercise_start_time=start, exercise_end_time=start + timedelta(minutes=minutes),
+    )
+
+
+class DiarySearchTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create(username='me')
+        self.friend = User.objects.create(username='friend')
+        self.stranger = User.objects.create(username='stranger')
+        Friend.objects.create(user1=self.me, user2=self.friend)
+        self.start = timezone.now() - timedelta(days=1)
+
+    def search(self, query):
+        user_ids = [self.me.pk, self.friend.pk]
+        return [record.diary for record in search_diaries(query, user_ids, 0, 20)]
+
+    def test_japanese_substring_scoped_to_me_and_friends(self):
+        create_record(self.me, self.start, diary='朝に川沿いをジョギングした')
+        create_record(self.friend, self.start + timedelta(minutes=1), diary='夜のジョギングは涼しい')
+        create_record(self.stranger, self.start + timedelta(minutes=2), diary='ジョギング三昧')
+        create_record(self.me, self.start + timedelta(minutes=3), diary='筋トレの日')
+
+        self.assertCountEqual(self.search('ジョギング'), ['朝に川沿いをジョギングした', '夜のジョギングは涼しい'])
+        self.assertEqual(self.search('ジョギング 川沿い'), ['朝に川沿いをジョギングした'])
+        # 3文字未満はLIKEで探す
+        self.assertEqual(self.search('筋ト'), ['筋トレの日'])
+
+    def test_index_follows_edit_and_delete(self):
+        record = create_record(self.me, self.start, diary='ストレッチをした')
+        record.diary = 'ヨガをした'
+        record.save()
+        self.assertEqual(self.search('ストレッチ'), [])
+        self.assertEqual(self.search('ヨガをした'), ['ヨガをした'])
+
+        record.delete()
+        self.assertEqual(self.search('ヨガをした'), [])
+
+    def test_view_paginates(self):
+        for i in range(25):
+            create_record(self.friend, self.start + timedelta(minutes=i), diary=f'ウォーキング{i}')
+        self.client.force_login(self.me)
+
+        response = self.client.get(reverse('diary_search'), {'q': 'ウォーキング'})
+        self.assertEqual(len(response.context['exercise_records']), 20)
+        self.assertEqual(response.context['next_page'], 2)
+
+        response = self.client.get(reverse('diary_search'), {'q': 'ウォーキング', 'page': 2})
+        self.assertEqual(len(response.context['exercise_records']), 5)
+        self.assertIsNone(response.context['next_page'])
+
+
+class SessionServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+
+    def test_double_start_keeps_first_start_time(self):
+        stale = User.objects.get(pk=self.user.pk)
+        started = start_session(self.user)
+        self.assertEqual(start_session(stale), started)
+        self.assertEqual(stale.last_exercise_time, started)
+
+    def test_double_end_creates_one_record(self):
+        start_session(self.user)
+        # 2つのリクエストがそれぞれ運動中のユーザーを読み込んだ状態
+        first = User.objects.get(pk=self.user.pk)
+        second = User.objects.get(pk=self.user.pk)
+
+        self.assertIsNotNone(end_session(first))
+        self.assertIsNone(end_session(second))
+        self.assertIsNone(end_session(first))
+        self.assertEqual(ExerciseRecord.objects.filter(user=self.user).count(), 1)
+
+    def test_double_submitted_end_form_creates_one_record(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('exercising'), {'action': 'start'})
+        first = self.client.post(reverse('exercising'), {'action': 'end'})
+        second = self.client.post(reverse('exercising'), {'action': 'end'})
+
+        record = ExerciseRecord.objects.get(user=self.user)
+        self.assertRedirects(first, reverse('post_exercise', args=[record.pk]))
+        self.assertRedirects(second, reverse('exercising'))
+
+
+class SessionApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.client.force_login(self.user)
+
+    def sync(self, sessions):
+        return self.client.post(
+            reverse('sync_sessions_json'), {'sessions': sessions}, content_type='application/json'
+        )
+
+    def test_start_and_stop(self):
+        started = self.client.post(reverse('start_session_json')).json()
+        self.assertTrue(started['exercising'])
+        # 二重に押しても開始時刻は変わらない
+        self.assertEqual(self.client.post(reverse('start_session_json')).json(), started)
+
+        response = self.client.post(reverse('stop_session_json'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['exercise_start_time'], started['started_at'])
+        self.assertEqual(self.client.post(reverse('stop_session_json')).status_code, 409)
+
+    def test_sync_is_idempotent_and_ends_server_session(self):
+        started_at = self.client.post(reverse('start_session_json')).json()['started_at']
+        end = (timezone.now() + timedelta(minutes=1)).isoformat()
+        sessions = [
+            {'exercise_start_time': started_at, 'exercise_end_time': end},
+            {'exercise_start_time': '2026-01-01T07:00:00+09:00', 'exercise_end_time': '2026-01-01T07:45:00+09:00'},
+        ]
+
+        self.assertEqual(self.sync(sessions).json(), {'created': 2, 'duplicates': 0, 'errors': []})
+        self.assertEqual(self.sync(sessions).json(), {'created': 0, 'duplicates': 2, 'errors': []})
+        self.assertEqual(ExerciseRecord.objects.get(exercise_end_time__lt=started_at).duration_minutes, 45)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_exercise_time)
+
+    def test_page_sends_the_queue_in_batches_the_api_accepts(self):
+        response = self.client.get(reverse('exercising'))
+        self.assertContains(response, f'const syncBatchSize = {SYNC_MAX_SESSIONS};')
+
+    def test_sync_rejects_invalid_sessions(self):
+        future = timezone.now() + timedelta(days=1)
+        result = self.sync([
+            {'exercise_start_time': future.isoformat(), 'exercise_end_time': (future + timedelta(hours=1)).isoformat()},
+            {'exercise_start_time': '2026-01-01T07:00:00+09:00', 'exercise_end_time': '2026-01-03T07:00:00+09:00'},
+            'oops',
+        ]).json()
+
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['line'] for error in result['errors']], [1, 2, 3])
+        self.assertEqual(self.sync('x').status_code, 400)
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='runner')
+        self.client.force_login(self.user)
+
+    def get_index(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('index'))
+        return response.content.decode(), [query['sql'] for query in context.captured_queries]
+
+    def test_record_list_is_cached_until_a_record_changes(self):
+        start = timezone.now() - timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            record = create_record(self.user, start, diary='朝ラン')
+
+        first, first_queries = self.get_index()
+        second, second_queries = self.get_index()
+        self.assertIn('朝ラン', second)
+        # 2回目は運動記録を読まない
+        self.assertTrue(any('exerciserecord' in sql for sql in first_queries))
+        self.assertFalse(any('exerciserecord' in sql for sql in second_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record.diary = '夜ラン'
+            record.save()
+        third, _ = self.get_index()
+        self.assertIn('夜ラン', third)
+        self.assertNotIn('朝ラン', third)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=3)
+
+    def row(self, days=0, minutes=30):
+        start = self.start + timedelta(days=days)
+        return {
+            'exercise_start_time': start.isoformat(),
+            'exercise_end_time': (start + timedelta(minutes=minutes)).isoformat(),
+        }
+
+    def test_created_at_is_the_end_time(self):
+        importer.import_records(enumerate([self.row(0), self.row(1)], start=2), user=self.user)
+        create_record(self.user, timezone.now() - timedelta(minutes=10), minutes=10)
+
+        records = ExerciseRecord.objects.filter(user=self.user).order_by('-created_at')
+        for record in records[1:]:
+            self.assertEqual(record.created_at, record.exercise_end_time)
+        # 取り込んだ過去の記録は今日の記録より後ろに並ぶ
+        self.assertEqual([r.exercise_start_time.date() for r in records][1:], [
+            (self.start + timedelta(days=1)).date(), self.start.date(),
+        ])
+
+    def test_duplicates_in_file_and_database_are_skipped(self):
+        importer.import_records(enumerate([self.row(0)], start=2), user=self.user)
+        result = importer.import_records(
+            enumerate([self.row(0), self.row(1), self.row(1)], start=2), user=self.user,
+        )
+        self.assertEqual((result['created'], result['duplicates']), (1, 2))
+        self.assertEqual(ExerciseRecord.objects.filter(user=self.user).count(), 2)
+
+    def test_concurrent_import_is_caught_by_the_unique_constraint(self):
+        create_record(self.user, self.start)
+        filter_ = ExerciseRecord.objects.filter
+        checks = []
+
+        def racing_filter(*args, **kwargs):
+            # 最初の重複チェックは別のリクエストが記録を作る前に終わっていた状態
+            checks.append(kwargs)
+            if len(checks) == 1:
+                return ExerciseRecord.objects.none()
+            return filter_(*args, **kwargs)
+
+        with mock.patch.object(ExerciseRecord.objects, 'filter', side_effect=racing_filter):
+            result = importer.import_records(enumerate([self.row(0), self.row(1)], start=2), user=self.user)
+        self.assertEqual((result['created'], result['duplicates']), (1, 1))
+        self.assertEqual(ExerciseRecord.objects.filter(user=self.user).count(), 2)
+
+    def test_malformed_rows_are_reported_by_line(self):
+        text = '\n'.join([
+            json.dumps(self.row(0)),
+            '{broken',
+            json.dumps({'exercise_start_time': 'yesterday', 'exercise_end_time': self.row(0)['exercise_end_time']}),
+            json.dumps(self.row(1, minutes=-5)),
+            json.dumps({**self.row(2), 'username': 'someone'}),
+            '[1, 2]',
+        ])
+        result = importer.import_records(importer.read_rows(text, importer.JSONL), user=self.user)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 4, 5, 6])
+
+    def test_csv_upload(self):
+        self.client.force_login(self.user)
+        row = self.row(0)
+        body = f"exercise_start_time,exercise_end_time,diary\n{row['exercise_start_time']},{row['exercise_end_time']},朝ラン\n"
+        response = self.client.post(reverse('import_exercise_records'), body, content_type='text/csv')
+        self.assertEqual(response.json(), {'created': 1, 'duplicates': 0, 'errors': []})
+        self.assertEqual(ExerciseRecord.objects.get(user=self.user).diary, '朝ラン')
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        start = timezone.now() - timedelta(days=1)
+        ExerciseRecord.objects.bulk_create([
+            ExerciseRecord(
+                user=self.user, duration_minutes=10,
+                exercise_start_time=start + timedelta(hours=i), exercise_end_time=start + timedelta(hours=i, minutes=10),
+            )
+            for i in range(5)
+        ])
+        # 同じ時刻に作られた記録は id で順序が決まる
+        ExerciseRecord.objects.update(created_at=start)
+        self.records = list(ExerciseRecord.objects.order_by('-created_at', '-id'))
+        self.queryset = ExerciseRecord.objects.filter(user=self.user)
+
+    def page(self, cursor=None, direction=None):
+        records, older, newer = paginate_by_cursor(
+            self.queryset, cursor=cursor, direction=direction, per_page=2,
+        )
+        return [r.pk for r in records], older, newer
+
+    def test_cursor_round_trip(self):
+        record = self.records[0]
+        self.assertEqual(decode_cursor(encode_cursor(record)), (record.created_at, record.pk))
+        for cursor in (None, '', 'not-a-cursor', 'bm8tc2VwYXJhdG9y'):
+            self.assertIsNone(decode_cursor(cursor))
+
+    def test_older_and_newer_with_equal_created_at(self):
+        ids = [r.pk for r in self.records]
+        first, older, newer = self.page()
+        self.assertEqual((first, newer), (ids[0:2], None))
+        second, older, newer = self.page(older)
+        self.assertEqual(second, ids[2:4])
+        third, last, newer = self.page(older)
+        self.assertEqual((third, last), (ids[4:], None))
+
+        back, older, newer = self.page(newer, NEWER)
+        self.assertEqual(back, ids[2:4])
+        self.assertEqual(decode_cursor(older)[1], ids[3])
+        # 最新まで戻ると最初のページと同じになる
+        back, _, newer = self.page(newer, NEWER)
+        self.assertEqual((back, newer), (ids[0:2], None))
+
+    def test_newer_from_a_deleted_record_returns_the_first_page(self):
+        _, older, _ = self.page()
+        _, _, newer = self.page(older)
+        ExerciseRecord.objects.filter(pk__in=[r.pk for r in self.records[:3]]).delete()
+
+        records, older, newer = self.page(newer, NEWER)
+        self.assertEqual(records, [r.pk for r in self.records[3:5]])
+        self.assertIsNone(newer)
+        self.assertIsNone(older)
+
+    def test_invalid_cursor_shows_the_first_page(self):
+        records, older, newer = self.page('broken', NEWER)
+        self.assertEqual(records, [r.pk for r in self.records[:2]])
+        self.assertIsNotNone(older)
+        self.assertIsNone(newer)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.other = User.objects.create(username='other')
+        self.client.force_login(self.user)
+        self.day = timezone.make_aware(datetime(2026, 10, 1, 7))
+        self.records = [
+            create_record(self.user, self.day, diary='朝ラン, 5km\n"快調"'),
+            create_record(self.user, self.day + timedelta(days=1)),
+            create_record(self.user, self.day + timedelta(days=2)),
+        ]
+        create_record(self.other, self.day + timedelta(days=1))
+
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_exercise_records'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_has_own_records_and_quotes_diaries(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([int(row['id']) for row in rows], [r.pk for r in self.records])
+        self.assertEqual({row['username'] for row in rows}, {'runner'})
+        self.assertEqual(rows[0]['diary'], self.records[0].diary)
+        self.assertEqual(rows[0]['exercise_start_time'], self.day.isoformat())
+
+    def test_jsonl_and_gzip_have_the_same_rows(self):
+        _, body = self.export(format='jsonl')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [r.pk for r in self.records])
+        self.assertEqual(rows[0]['duration_minutes'], 30)
+
+        response, compressed = self.export(format='jsonl', gzip=1)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('exercise_records.jsonl.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(compressed), body)
+
+    def test_date_range_includes_the_until_day(self):
+        _, body = self.export(format='jsonl', since='2026-10-02', until='2026-10-02')
+        self.assertEqual([json.loads(line)['id'] for line in body.decode().splitlines()], [self.records[1].pk])
+        _, body = self.export(format='jsonl', since='2026-10-02')
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+    def test_invalid_parameters(self):
+        url = reverse('export_exercise_records')
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': '2026/10/01'}).status_code, 400)
+        # スタッフ以外は他のユーザーを指定しても自分の記録だけ
+        _, body = self.export(format='jsonl', user='all')
+        self.assertEqual(len(body.decode().splitlines()), 3)
 
-# Create your tests here.
+    def test_staff_can_export_everyone(self):
+        self.user.is_staff = True
+        self.user.save()
+        _, body = self.export(format='jsonl', user='all')
+        self.assertEqual(len(body.decode().splitlines()), 4)
+        _, body = self.export(format='jsonl', user='other')
+        self.assertEqual([json.loads(line)['username'] for line in body.decode().splitlines()], ['other'])
@@ -4,7 +4,15 @@ from . import views
 
 urlpatterns = [
     path("",views.index_view, name="index"),
+    path("records.json", views.exercise_records_json, name="exercise_records_json"),
     path("post/<int:pk>/", views.post_exercise, name="post_exercise"),
     path("exercising/", views.exercising, name="exercising"),
+    path("exercising/session.json", views.session_state_json, name="session_state_json"),
+    path("exercising/start.json", views.start_session_json, name="start_session_json"),
+    path("exercising/stop.json", views.stop_session_json, name="stop_session_json"),
+    path("exercising/sync.json", views.sync_sessions_json, name="sync_sessions_json"),
+    path("export/", views.export_exercise_records, name="export_exercise_records"),
+    path("import/", views.import_exercise_records, name="import_exercise_records"),
+    path("diary_search/", views.diary_search, name="diary_search"),
     path("friends_exercise_records/", views.friends_execise_records, name="friends_exercise_records"),
 ]
\ No newline at end of file
@@ -1,15 +1,57 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
 from django.contrib import messages
-from exerciseRecord.forms import ExerciseRecordForm
-from django.utils import timezone
 from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.functional import SimpleLazyObject
+from accounts.models import User
+from config import fragments
+from exerciseRecord.forms import ExerciseRecordForm
+from feed import live
+from feed.consts import FEED_ITEMS
+from feed.services import timeline_records
+from friend.cache import cached_friend_ids, cached_request_counts
 from .models import ExerciseRecord
-from friend.models import Friend
-from .consts import ITEM_PER_PAGE
-from django.db.models import Q
+from .consts import DIARY_SEARCH_PAGE_SIZE, ITEM_PER_PAGE, SYNC_MAX_SESSIONS
+from .pagination import NEWER, OLDER, paginate_by_cursor
+from .search import search_diaries
+from .services import end_session, own_records, start_session, sync_sessions
+from .export import CSV, FORMATS, export_queryset, gzip_chunks, iter_lines, parse_date
+from . import importer
+
+
+def _record_to_dict(record):
+    """
+    運動記録をJSON用の辞書に変換
+    """
+    return {
+        'id': record.pk,
+        'exercise_start_time': record.exercise_start_time.isoformat(),
+        'exercise_end_time': record.exercise_end_time.isoformat(),
+        'duration_minutes': record.duration_minutes,
+        'diary': record.diary,
+        'created_at': record.created_at.isoformat(),
+    }
+
+
+def _paginate_own_records(request):
+    """
+    ログインユーザーの運動記録をカーソルでページ分割
+    ?cursor=...&direction=older|newer
+    """
+    direction = NEWER if request.GET.get('direction') == NEWER else OLDER
+    return paginate_by_cursor(
+        own_records(request.user),
+        cursor=request.GET.get('cursor'),
+        direction=direction,
+        per_page=ITEM_PER_PAGE,
+    )
 
 
 @login_required
@@ -26,28 +68,14 @@ def exercising(request):
         action = request.POST.get('action')
         if action == 'start': # 運動開始
             # 現在時刻を記録（ここからタイマー開始）
-            user.last_exercise_time = timezone.now()
-            user.save()
+            # last_exercise_time だけを条件付きで更新する（パスワード等の列には触れない）
+            start_session(user)
             # ページをリロードしてタイマー表示に切り替え
         elif action == 'end': # 運動終了
-            # 運動中（last_exercise_timeが存在する）場合のみ処理
-            if user.last_exercise_time is not None:
-                start_time = user.last_exercise_time
-                end_time = timezone.now()
-                # 開始時刻と終了時刻から運動時間（分）を計算
-                duration_minutes = ExerciseRecord.calculate_duration(start_time, end_time)
-                # 運動記録（ExerciseRecord）をデータベースに保存
-                # 日記 (diary) はまだ空のまま作成
-                record = ExerciseRecord.objects.create(
-                    user=user,
-                    exercise_start_time=start_time,
-                    exercise_end_time=end_time,
-                    duration_minutes=duration_minutes,
-                    diary=''
-                )
-                # ユーザーの運動中状態を解除（次回のためにリセット）
-                user.last_exercise_time = None
-                user.save()
+            # 運動中の場合のみ運動記録を作成し、運動中状態を解除する
+            # 二重送信された場合でも記録は1件だけ作られる
+            record = end_session(user)
+            if record is not None:
                 # 投稿画面（日記入力画面）へリダイレクト
                 return redirect('post_exercise', pk=record.pk)
             # エラー等の場合はタイマー画面に戻る
@@ -56,12 +84,84 @@ def exercising(request):
     is_exercising = user.last_exercise_time is not None
     context = {
         'is_exercising': is_exercising,
+        # JSタイマー用（開始時刻はタイムゾーン付きのISO形式で渡す）
+        'timer_state': _session_state(user),
+        # 未送信の運動はこの件数ずつ送る
+        'sync_max_sessions': SYNC_MAX_SESSIONS,
     }
     # 運動中なら開始時刻をテンプレートに渡す（JSタイマー用）
     if is_exercising:
         context['start_time'] = user.last_exercise_time
     return render(request, 'exerciseRecord/exercising.html', context)
 
+
+def _session_state(user):
+    """
+    タイマーの状態（運動中かどうかと、タイムゾーン付きISO形式の開始時刻）
+    """
+    started_at = user.last_exercise_time
+    return {
+        'exercising': started_at is not None,
+        'started_at': started_at.isoformat() if started_at else None,
+    }
+
+
+@login_required
+def session_state_json(request):
+    """
+    運動中かどうかと開始時刻（JSON版）
+    """
+    return JsonResponse(_session_state(request.user))
+
+
+@login_required
+@require_POST
+def start_session_json(request):
+    """
+    運動開始（JSON版）
+    既に運動中の場合はその開始時刻を返す
+    """
+    start_session(request.user)
+    return JsonResponse(_session_state(request.user))
+
+
+@login_required
+@require_POST
+def stop_session_json(request):
+    """
+    運動終了（JSON版）
+    作成した運動記録と日記入力画面のURLを返す
+    """
+    record = end_session(request.user)
+    if record is None:
+        return JsonResponse({'error': '運動中ではありません'}, status=409)
+
+    data = _record_to_dict(record)
+    data['post_url'] = reverse('post_exercise', args=[record.pk])
+    return JsonResponse(data, status=201)
+
+
+@login_required
+@require_POST
+def sync_sessions_json(request):
+    """
+    オフライン中に記録した運動をまとめて登録
+    本文: {"sessions": [{"exercise_start_time": ISO形式, "exercise_end_time": ISO形式}, ...]}
+    同じ運動を何度送っても記録は1件だけ作られる
+    """
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'JSONで送ってください'}, status=400)
+    sessions = body.get('sessions') if isinstance(body, dict) else None
+    if not isinstance(sessions, list):
+        return JsonResponse({'error': 'sessions を配列で指定してください'}, status=400)
+    if len(sessions) > SYNC_MAX_SESSIONS:
+        return JsonResponse({'error': f'1回に送れるのは{SYNC_MAX_SESSIONS}件までです'}, status=400)
+
+    return JsonResponse(sync_sessions(request.user, sessions))
+
+
 @login_required
 def post_exercise(request, pk):
     """
@@ -96,42 +196,156 @@ def post_exercise(request, pk):
         'record': record
     })
 
+
+def _lazy_page(request):
+    """
+    断片キャッシュに当たった場合は運動記録を読まないよう、テンプレートで使われた時に取得する
+    """
+    def load():
+        records, older_cursor, newer_cursor = _paginate_own_records(request)
+        return {'records': records, 'older_cursor': older_cursor, 'newer_cursor': newer_cursor}
+    return SimpleLazyObject(load)
+
+
 @login_required
 def index_view(request):
-    exercise_records = ExerciseRecord.objects.filter(user=request.user).order_by("-created_at")
-
     return render(
         request,
         "exerciseRecord/index.html",
         {
-            "exercise_records": exercise_records,
+            "page": _lazy_page(request),
+            "cursor": request.GET.get('cursor', ''),
+            "direction": request.GET.get('direction', ''),
+            "request_counts": cached_request_counts(request.user),
             "user_profile": request.user,  # ←ここでユーザー情報を渡す
+            **fragments.context(request.user, fragments.RECORDS, fragments.PROFILE),
         },
     )
 
 
+@login_required
+def exercise_records_json(request):
+    """
+    自分の運動記録一覧（JSON版）
+    """
+    exercise_records, older_cursor, newer_cursor = _paginate_own_records(request)
+
+    return JsonResponse({
+        'results': [_record_to_dict(record) for record in exercise_records],
+        'older_cursor': older_cursor,
+        'newer_cursor': newer_cursor,
+    })
+
+
 @login_required
 def friends_execise_records(request):
     """
     フレンドの運動記録を取得
+    書き込み時に展開済みのタイムラインを読むだけ
+    断片キャッシュに当たった場合はタイムラインも読まない
     """
+    friends_exercise_records = SimpleLazyObject(lambda: timeline_records(request.user, FEED_ITEMS))  # 最新50件
+
+    context = {
+        'exercise_records': friends_exercise_records,
+        # ASGIで動いている時だけライブ配信に接続する
+        'live_updates': live.available(request),
+        **fragments.context(request.user, fragments.FEED),
+    }
+    return render(request, 'exerciseRecord/friends_exercise_records.html', context)
 
-    # フレンド一覧を取得
-    friendships = Friend.objects.filter(
-        Q(user1=request.user) | Q(user2=request.user)
-    )
 
-    friend_ids = []
-    for friendship in friendships:
-        if friendship.user1 == request.user:
-            friend_ids.append(friendship.user2.id)
+@login_required
+def diary_search(request):
+    """
+    自分とフレンドの運動日記を全文検索（関連度順）
+    """
+    query = request.GET.get("q", "").strip()
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+
+    records = []
+    has_next = False
+    if query:
+        user_ids = [request.user.pk, *cached_friend_ids(request.user)]
+        offset = (page - 1) * DIARY_SEARCH_PAGE_SIZE
+        # 1件多く取得して次のページがあるかを判定（件数を数えるクエリを省く）
+        records = search_diaries(query, user_ids, offset, DIARY_SEARCH_PAGE_SIZE + 1)
+        has_next = len(records) > DIARY_SEARCH_PAGE_SIZE
+        records = records[:DIARY_SEARCH_PAGE_SIZE]
+
+    return render(request, "exerciseRecord/diary_search.html", {
+        "query": query,
+        "exercise_records": records,
+        "page": page,
+        "previous_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if has_next else None,
+    })
+
+
+@login_required
+def export_exercise_records(request):
+    """
+    運動記録のエクスポート（CSV / JSONL をストリーミングで返す）
+    ?format=csv|jsonl&since=YYYY-MM-DD&until=YYYY-MM-DD&gzip=1
+    スタッフは ?user=ユーザー名 で他ユーザー、?user=all で全件を出力できる
+    """
+    fmt = request.GET.get('format', CSV)
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest('format は csv か jsonl を指定してください')
+
+    try:
+        since = parse_date(request.GET['since']) if request.GET.get('since') else None
+        until = parse_date(request.GET['until'], end=True) if request.GET.get('until') else None
+    except ValueError:
+        return HttpResponseBadRequest('日付は YYYY-MM-DD で指定してください')
+
+    user_ids = [request.user.pk]
+    username = request.GET.get('user')
+    if username and request.user.is_staff:
+        if username == 'all':
+            user_ids = None
         else:
-            friend_ids.append(friendship.user1.id)
+            user_ids = list(User.objects.filter(username=username).values_list('pk', flat=True))
+
+    lines = iter_lines(export_queryset(user_ids, since, until), fmt)
+    filename = f"exercise_records.{fmt}"
+    content_type = 'text/csv; charset=utf-8' if fmt == CSV else 'application/x-ndjson; charset=utf-8'
+    if request.GET.get('gzip'):
+        lines = gzip_chunks(lines)
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@require_POST
+def import_exercise_records(request):
+    """
+    運動記録のまとめてインポート（ウェアラブル端末の同期用）
+    本文に CSV（ヘッダー行あり）または JSONL を送る、もしくは file でアップロードする
+    ?format=csv|jsonl（省略時は Content-Type から判断）
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        text = upload.read()
+    else:
+        text = request.body
+    try:
+        text = text.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return JsonResponse({'error': 'UTF-8で送ってください'}, status=400)
 
-    # フレンドの運動記録を取得
-    friends_exercise_records = ExerciseRecord.objects.filter(
-        user_id__in=friend_ids
-    ).select_related('user').order_by('-created_at')[:50]  # 最新50件
+    fmt = request.GET.get('format')
+    if fmt is None:
+        fmt = importer.JSONL if 'json' in request.content_type else importer.CSV
+    if fmt not in importer.FORMATS:
+        return JsonResponse({'error': 'format は csv か jsonl を指定してください'}, status=400)
 
-    context = {'exercise_records': friends_exercise_records,}
-    return render(request, 'exerciseRecord/friends_exercise_records.html', context)
\ No newline at end of file
+    result = importer.import_records(importer.read_rows(text, fmt), user=request.user)
+    return JsonResponse(result)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FeedConfig(AppConfig):
+    name = 'feed'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,4 @@
+# フレンドになった時に取り込む相手の過去記録の件数
+FEED_BACKFILL_LIMIT = 50
+# タイムラインに表示する件数
+FEED_ITEMS = 50
@@ -0,0 +1,30 @@
+from exerciseRecord.models import ExerciseRecord
+from friend.models import FriendLink
+from jobs.queue import handler
+from . import services
+
+FAN_OUT = 'feed.fan_out'
+BACKFILL = 'feed.backfill'
+
+
+@handler(FAN_OUT, batch_size=200)
+def fan_out(payloads):
+    """
+    運動記録をフレンドのタイムラインに書き込む（投稿者ごとにフレンドを1回だけ取得）
+    実行までに削除された記録は飛ばす
+    """
+    record_ids = {payload['record_id'] for payload in payloads}
+    records = ExerciseRecord.objects.filter(id__in=record_ids).only('id', 'user_id', 'created_at')
+    services.fan_out_records(list(records))
+
+
+@handler(BACKFILL, batch_size=50)
+def backfill(payloads):
+    """
+    フレンドになった相手の最近の記録をタイムラインに取り込む
+    実行までにフレンド解除された場合は取り込まない
+    """
+    for payload in payloads:
+        owner_id, author_id = payload['owner_id'], payload['author_id']
+        if FriendLink.objects.filter(user_id=owner_id, friend_id=author_id).exists():
+            services.backfill(owner_id, author_id)
@@ -0,0 +1,72 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+
+from .pubsub import get_broker
+
+STARTED = "friend_started"
+FINISHED = "friend_finished"
+# 接続の内部で使うイベント（ブラウザには送らない）
+FRIENDS_CHANGED = "friends_changed"
+
+
+def available(request):
+    """
+    ライブ配信できるか
+    WSGI（runserver・config.wsgi）では終わらないレスポンスがスレッドを占有し続けるため、ASGIの時だけ配信する
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def control_channel(user_id):
+    """
+    user_id 本人の接続だけが購読するチャンネル（フレンドの増減を知らせる）
+    """
+    return f"friends:{user_id}"
+
+
+def channels_for(user_id, friend_ids):
+    return [*friend_ids, control_channel(user_id)]
+
+
+def started_event(user, started_at):
+    return {
+        'type': STARTED,
+        'user_id': user.pk,
+        'username': user.username,
+        'at': started_at.isoformat(),
+    }
+
+
+def finished_event(record):
+    return {
+        'type': FINISHED,
+        'user_id': record.user_id,
+        'username': record.user.username,
+        'record_id': record.pk,
+        'duration_minutes': record.duration_minutes,
+        'at': record.exercise_end_time.isoformat(),
+    }
+
+
+def publish(user_id, event):
+    """
+    user_id のフレンドの接続にイベントを送る
+    """
+    get_broker().publish(user_id, event)
+
+
+def format_sse(event):
+    """
+    Server-Sent Events の1件分の文字列
+    """
+    data = json.dumps(event, ensure_ascii=False)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+def publish_friends_changed(user_ids):
+    """
+    フレンドが増減したことを本人の接続に知らせる（接続中に購読するフレンドを入れ替える）
+    """
+    for user_id in user_ids:
+        get_broker().publish(control_channel(user_id), {'type': FRIENDS_CHANGED})
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from feed import services
+from feed.consts import FEED_BACKFILL_LIMIT
+
+
+class Command(BaseCommand):
+    help = "フレンドの運動記録タイムラインを全ユーザー分作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=FEED_BACKFILL_LIMIT,
+            help="フレンド1人あたりに取り込む記録の件数",
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="対象ユーザー名（複数指定可、省略時は全ユーザー）",
+        )
+
+    def handle(self, *args, limit, usernames, **options):
+        users = User.objects.order_by('pk')
+        if usernames:
+            users = users.filter(username__in=usernames)
+
+        count = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                services.rebuild_timeline(user_id, limit=limit)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{count}人のタイムラインを作り直しました"))
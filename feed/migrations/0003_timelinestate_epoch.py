@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0002_timelinestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelinestate',
+            name='epoch',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+from feed.consts import FEED_BACKFILL_LIMIT
+
+
+def populate_timelines(apps, schema_editor):
+    """
+    既存のフレンド関係から、フレンドの最近の運動記録をタイムラインへ取り込む
+    （rebuild_timelines と同じく、フレンド1人あたり FEED_BACKFILL_LIMIT 件）
+    """
+    ExerciseRecord = apps.get_model('exerciseRecord', 'ExerciseRecord')
+    FriendLink = apps.get_model('friend', 'FriendLink')
+    TimelineEntry = apps.get_model('feed', 'TimelineEntry')
+
+    # 投稿者ごとに記録を1回だけ読む
+    owners = defaultdict(list)
+    for owner_id, author_id in FriendLink.objects.values_list('user_id', 'friend_id').iterator():
+        owners[author_id].append(owner_id)
+
+    entries = []
+    for author_id, owner_ids in owners.items():
+        records = list(
+            ExerciseRecord.objects
+            .filter(user_id=author_id)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:FEED_BACKFILL_LIMIT]
+        )
+        entries.extend(
+            TimelineEntry(owner_id=owner_id, author_id=author_id, record_id=record_id, created_at=created_at)
+            for owner_id in owner_ids
+            for record_id, created_at in records
+        )
+        if len(entries) >= 5000:
+            TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exerciseRecord', '0004_diary_search_index'),
+        ('feed', '0003_timelinestate_epoch'),
+        ('friend', '0004_populate_friendlink'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
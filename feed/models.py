@@ -0,0 +1,60 @@
+from django.db import models
+from accounts.models import User
+from exerciseRecord.models import ExerciseRecord
+
+
+class TimelineEntry(models.Model):
+    """
+    フレンドの運動記録タイムライン（書き込み時に展開）
+    owner のタイムラインに author の記録 record を1行ずつ持つ
+    """
+    owner = models.ForeignKey(
+        User,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    record = models.ForeignKey(
+        ExerciseRecord,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    # 並び順用に記録の created_at を複製して持つ
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'record'], name='timeline_owner_record_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-id'], name='timeline_owner_created_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} ← {self.record}"
+
+
+class TimelineState(models.Model):
+    """
+    ユーザーごとのタイムラインの版（ETag / Last-Modified 用）
+    タイムラインの内容が変わるたびに version を増やす
+    新しい記録の追加以外（日記の更新・削除・過去記録の取り込み・フレンド解除）では epoch も増やす
+    """
+    owner = models.OneToOneField(
+        User,
+        related_name='timeline_state',
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    version = models.PositiveIntegerField(default=0)
+    # 差分同期のやり直しが必要な変更の回数
+    epoch = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.owner_id} v{self.version}"
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class TooManyConnections(Exception):
+    """
+    同時接続数の上限を超えた
+    """
+
+
+class Subscription:
+    """
+    1つのSSE接続の購読
+    publish はどのスレッドから呼ばれてもよく、購読側のイベントループに渡す
+    """
+    def __init__(self, broker, user_id, channels, loop, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.channels = set(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # 読むのが遅い接続のイベントは捨てる
+            pass
+
+    async def get(self, timeout):
+        """
+        次のイベントを待つ（timeout 秒で来なければ None）
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def update(self, channels):
+        """
+        購読するチャンネルを入れ替える（フレンドの増減時）
+        """
+        self.broker.set_channels(self, channels)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    プロセス内のpub/sub（チャンネル = 運動したユーザーのID）
+    複数プロセスで動かす場合は同じインターフェースの外部ブローカー（Redis等）に
+    LIVE_BROKER で差し替える
+    """
+    def __init__(self, max_connections, max_connections_per_user, queue_size=100):
+        self.max_connections = max_connections
+        self.max_connections_per_user = max_connections_per_user
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._per_user = {}
+        self._count = 0
+
+    def subscribe(self, user_id, channels):
+        """
+        channels のイベントを購読する（イベントループ上から呼ぶ）
+        """
+        subscription = Subscription(self, user_id, channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if self._count >= self.max_connections:
+                raise TooManyConnections("同時接続数の上限に達しました")
+            if self._per_user.get(user_id, 0) >= self.max_connections_per_user:
+                raise TooManyConnections("1人あたりの同時接続数の上限に達しました")
+            self._count += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._discard(subscription, subscription.channels)
+            self._count -= 1
+            self._per_user[subscription.user_id] -= 1
+            if not self._per_user[subscription.user_id]:
+                del self._per_user[subscription.user_id]
+
+    def _discard(self, subscription, channels):
+        # self._lock を取った状態で呼ぶ
+        for channel in channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[channel]
+
+    def set_channels(self, subscription, channels):
+        channels = set(channels)
+        with self._lock:
+            if subscription.closed:
+                return
+            self._discard(subscription, subscription.channels - channels)
+            for channel in channels - subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+            subscription.channels = channels
+
+    def publish(self, channel, event):
+        """
+        channel の購読者全員にイベントを送る（どのスレッドからでも呼べる）
+        """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    LIVE_BROKER で指定したブローカーを返す（プロセスに1つ）
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = import_string(settings.LIVE_BROKER)
+            _broker = broker_class(
+                max_connections=settings.LIVE_MAX_CONNECTIONS,
+                max_connections_per_user=settings.LIVE_MAX_CONNECTIONS_PER_USER,
+            )
+    return _broker
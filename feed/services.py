@@ -0,0 +1,178 @@
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from config import fragments
+from exerciseRecord.models import ExerciseRecord
+from friend.services import friend_ids
+from .consts import FEED_BACKFILL_LIMIT
+from .models import TimelineEntry, TimelineState
+
+
+def bump_version(owner_ids, reset=False):
+    """
+    タイムラインの版を進める（ETagを変える）
+    reset=True の場合は epoch も進め、差分同期中のクライアントに取り直させる
+    フレンド運動一覧の断片キャッシュもコミット後に破棄する
+    """
+    owner_ids = set(owner_ids)
+    if not owner_ids:
+        return
+    fragments.bump_on_commit(fragments.FEED, owner_ids)
+    # 版の行がなければ作ってから進める（読む側では書き込まない）
+    TimelineState.objects.bulk_create(
+        [TimelineState(owner_id=owner_id) for owner_id in owner_ids],
+        ignore_conflicts=True,
+    )
+    changes = {'version': F('version') + 1, 'updated_at': timezone.now()}
+    if reset:
+        changes['epoch'] = F('epoch') + 1
+    TimelineState.objects.filter(owner_id__in=owner_ids).update(**changes)
+
+
+def _insert_entries(entries):
+    """
+    タイムラインに書き込んで版を進める
+    既にある記録より古い記録が入ったタイムラインは、カーソルより前に入るので epoch も進める
+    """
+    owner_ids = {entry.owner_id for entry in entries}
+    newest = dict(
+        TimelineEntry.objects
+        .filter(owner_id__in=owner_ids)
+        .values('owner_id')
+        .annotate(newest=Max('created_at'))
+        .values_list('owner_id', 'newest')
+    )
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    older = {
+        entry.owner_id for entry in entries
+        if entry.owner_id in newest and entry.created_at < newest[entry.owner_id]
+    }
+    bump_version(owner_ids - older)
+    bump_version(older, reset=True)
+
+
+def fan_out_record(record):
+    """
+    運動記録の更新（日記の投稿など）を投稿者の全フレンドのタイムラインに反映する
+    タイムラインの行はそのままで、版と epoch だけ進める
+    """
+    bump_version(friend_ids(record.user_id), reset=True)
+
+
+def fan_out_records(records):
+    """
+    まとめて作成した運動記録をタイムラインに書き込む
+    投稿者ごとにフレンドを1回だけ取得する
+    """
+    friends = {}
+    entries = []
+    for record in records:
+        if record.user_id not in friends:
+            friends[record.user_id] = friend_ids(record.user_id)
+        entries.extend(
+            TimelineEntry(
+                owner_id=friend_id,
+                author_id=record.user_id,
+                record_id=record.pk,
+                created_at=record.created_at,
+            )
+            for friend_id in friends[record.user_id]
+        )
+    _insert_entries(entries)
+
+
+def backfill(owner_id, author_id, limit=FEED_BACKFILL_LIMIT):
+    """
+    author の最近の運動記録を owner のタイムラインに取り込む
+    """
+    records = (
+        ExerciseRecord.objects
+        .filter(user_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                owner_id=owner_id,
+                author_id=author_id,
+                record_id=record_id,
+                created_at=created_at,
+            )
+            for record_id, created_at in records
+        ],
+        ignore_conflicts=True,
+    )
+    # 過去の記録なのでカーソルより前に入る
+    bump_version([owner_id], reset=True)
+
+
+def purge(owner_id, author_id):
+    """
+    author の記録を owner のタイムラインから削除
+    """
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+    bump_version([owner_id], reset=True)
+
+
+def timeline(user):
+    """
+    user のタイムライン（記録と投稿者つき）
+    """
+    return TimelineEntry.objects.filter(owner=user).select_related('record__user')
+
+
+def latest_entries(user, limit):
+    """
+    user のタイムラインの新しい順 limit 件（インデックスの範囲検索1回）
+    """
+    return timeline(user).order_by('-created_at', '-id')[:limit]
+
+
+def timeline_records(user, limit):
+    """
+    user のタイムラインの運動記録を新しい順に取得
+    """
+    return [entry.record for entry in latest_entries(user, limit)]
+
+
+def rebuild_timeline(user_id, limit=FEED_BACKFILL_LIMIT):
+    """
+    user のタイムラインを作り直す
+    """
+    TimelineEntry.objects.filter(owner_id=user_id).delete()
+    for friend_id in friend_ids(user_id):
+        backfill(user_id, friend_id, limit=limit)
+    bump_version([user_id], reset=True)
+
+
+def timeline_since(user, cursor, limit):
+    """
+    カーソルより新しいタイムラインを古い順に取得
+    戻り値: (TimelineEntryのリスト, 続きがあるか)
+    """
+    if cursor is None:
+        # 初回は最新の limit 件
+        return list(latest_entries(user, limit))[::-1], False
+
+    entries = list(entries_since(user, cursor, limit))
+    return entries[:limit], len(entries) > limit
+
+
+def entries_since(user, cursor, limit):
+    """
+    カーソルより新しいタイムラインを古い順に limit + 1 件（続きがあるかの判定用）
+    """
+    created_at, pk = cursor
+    return (
+        timeline(user)
+        .filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        .order_by('created_at', 'id')[:limit + 1]
+    )
+
+
+def timeline_state(user):
+    """
+    タイムラインの版（まだ書き込みのないユーザーは版0の未保存の行）
+    """
+    return TimelineState.objects.filter(owner=user).first() or TimelineState(owner=user)
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from exerciseRecord.models import ExerciseRecord
+from exerciseRecord.signals import records_bulk_created, session_started
+from friend.models import Friend
+from friend.services import friend_ids
+from jobs.queue import enqueue, enqueue_many
+from . import live, services
+from .jobs import BACKFILL, FAN_OUT
+
+
+@receiver(post_save, sender=ExerciseRecord)
+def fan_out_on_record_save(sender, instance, created, raw=False, **kwargs):
+    """
+    運動記録の作成時はフレンドのタイムラインへの書き込みをジョブに回す
+    日記投稿など更新時は版を進めるだけなのでその場で行う
+    """
+    if raw:
+        return
+    if created:
+        enqueue(FAN_OUT, {'record_id': instance.pk}, key=f'{FAN_OUT}:{instance.pk}')
+    else:
+        services.fan_out_record(instance)
+
+
+@receiver(post_delete, sender=ExerciseRecord)
+def bump_on_record_delete(sender, instance, **kwargs):
+    """
+    運動記録の削除（タイムラインからはCASCADEで消える）で版と epoch を進める
+    """
+    services.bump_version(friend_ids(instance.user_id), reset=True)
+
+
+@receiver(records_bulk_created, sender=ExerciseRecord)
+def fan_out_on_bulk_create(sender, records, **kwargs):
+    """
+    まとめて作成された運動記録をフレンドのタイムラインへ書き込む（ジョブで実行）
+    """
+    enqueue_many(FAN_OUT, [{'record_id': record.pk} for record in records])
+
+
+@receiver(post_save, sender=Friend)
+def backfill_on_friend_create(sender, instance, created, raw=False, **kwargs):
+    """
+    フレンドになったらお互いの最近の記録をタイムラインへ取り込む（ジョブで実行）
+    """
+    if raw or not created:
+        return
+    enqueue_many(BACKFILL, [
+        {'owner_id': instance.user1_id, 'author_id': instance.user2_id},
+        {'owner_id': instance.user2_id, 'author_id': instance.user1_id},
+    ])
+
+
+@receiver(post_delete, sender=Friend)
+def purge_on_friend_delete(sender, instance, **kwargs):
+    """
+    フレンド解除時にお互いの記録をタイムラインから削除
+    （解除した相手の記録がすぐ見えなくなるよう、ジョブに回さずその場で行う）
+    """
+    services.purge(instance.user1_id, instance.user2_id)
+    services.purge(instance.user2_id, instance.user1_id)
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def publish_friends_changed(sender, instance, raw=False, **kwargs):
+    """
+    フレンドの増減を2人のライブ配信の接続に知らせる
+    """
+    if raw:
+        return
+    user_ids = [instance.user1_id, instance.user2_id]
+    transaction.on_commit(lambda: live.publish_friends_changed(user_ids))
+
+
+@receiver(session_started, sender=User)
+def publish_started(sender, user, started_at, **kwargs):
+    """
+    運動開始をフレンドのライブ配信に流す
+    """
+    event = live.started_event(user, started_at)
+    transaction.on_commit(lambda: live.publish(user.pk, event))
+
+
+@receiver(post_save, sender=ExerciseRecord)
+def publish_finished(sender, instance, created, raw=False, **kwargs):
+    """
+    運動終了（運動記録の作成）をフレンドのライブ配信に流す
+    """
+    if raw or not created:
+        return
+    event = live.finished_event(instance)
+    transaction.on_commit(lambda: live.publish(instance.user_id, event))
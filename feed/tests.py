@@ -0,0 +1,206 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from exerciseRecord.models import ExerciseRecord
+from friend.models import Friend
+from jobs.queue import enqueue
+from jobs.worker import run_pending
+from . import live, pubsub, services
+from .jobs import BACKFILL
+from .models import TimelineEntry
+
+
+def create_record(user, minutes_ago=30, minutes=30):
+    """
+    minutes_ago 分前に終わった運動記録を作る
+    """
+    start = timezone.now() - timedelta(minutes=minutes_ago + minutes)
+    return ExerciseRecord.objects.create(
+        user=user, duration_minutes=minutes,
+        exercise_start_time=start, exercise_end_time=start + timedelta(minutes=minutes),
+    )
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.friend = User.objects.create(username='friend')
+        self.other = User.objects.create(username='other')
+        self.stranger = User.objects.create(username='stranger')
+        Friend.objects.create(user1=self.user, user2=self.friend)
+        Friend.objects.create(user1=self.other, user2=self.friend)
+        run_pending()
+
+    def owners_of(self, record):
+        return set(TimelineEntry.objects.filter(record=record).values_list('owner_id', flat=True))
+
+    def test_new_records_fan_out_to_friends_only(self):
+        record = create_record(self.friend)
+        # 作成時はジョブに回るので、まだ書き込まれていない
+        self.assertEqual(self.owners_of(record), set())
+        run_pending()
+        self.assertEqual(self.owners_of(record), {self.user.pk, self.other.pk})
+        self.assertEqual(services.timeline_records(self.user, 10), [record])
+        self.assertEqual(services.timeline_records(self.stranger, 10), [])
+
+    def test_deleted_record_before_the_job_runs_is_skipped(self):
+        record = create_record(self.friend)
+        record.delete()
+        run_pending()
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_new_friend_backfills_both_ways(self):
+        mine = create_record(self.user, 60)
+        theirs = create_record(self.stranger, 90)
+        run_pending()
+        Friend.objects.create(user1=self.stranger, user2=self.user)
+        run_pending()
+        self.assertEqual(self.owners_of(mine), {self.friend.pk, self.stranger.pk})
+        self.assertEqual(self.owners_of(theirs), {self.user.pk})
+
+    def test_unfriend_purges_both_timelines(self):
+        mine = create_record(self.user)
+        theirs = create_record(self.friend)
+        run_pending()
+        # 解除前に積まれていた取り込みジョブ
+        enqueue(BACKFILL, {'owner_id': self.user.pk, 'author_id': self.friend.pk})
+
+        Friend.objects.get(user1=self.user, user2=self.friend).delete()
+        self.assertEqual(self.owners_of(mine), set())
+        # 他のフレンドのタイムラインには残る
+        self.assertEqual(self.owners_of(theirs), {self.other.pk})
+        run_pending()
+        self.assertEqual(services.timeline_records(self.user, 10), [])
+
+
+class FeedJsonTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.friend = User.objects.create(username='friend')
+        Friend.objects.create(user1=self.user, user2=self.friend)
+        run_pending()
+        self.client.force_login(self.user)
+        self.url = reverse('feed:friend_feed_json')
+
+    def record(self, minutes_ago):
+        record = create_record(self.friend, minutes_ago)
+        run_pending()
+        return record
+
+    def get(self, data=None, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(self.url, data or {}, headers=headers)
+
+    def test_not_modified_and_reading_does_not_write(self):
+        self.record(10)
+        with CaptureQueriesContext(connection) as context:
+            first = self.get()
+        # 版の行は作らない
+        self.assertEqual([q['sql'] for q in context.captured_queries if not q['sql'].startswith('SELECT')], [])
+        self.assertEqual(len(first.json()['results']), 1)
+        self.assertEqual(self.get(etag=first['ETag']).status_code, 304)
+
+        self.record(5)
+        self.assertEqual(self.get(etag=first['ETag']).status_code, 200)
+
+    @mock.patch('feed.views.FEED_ITEMS', 2)
+    def test_paging_with_since_is_not_answered_with_304(self):
+        self.record(10)
+        data = self.get().json()
+        for minutes_ago in (5, 4, 3, 2, 1):
+            self.record(minutes_ago)
+
+        first = self.get({'since': data['cursor'], 'epoch': data['epoch']})
+        page = first.json()
+        self.assertTrue(page['has_more'])
+        self.assertFalse(page['reset'])
+        seen = [item['id'] for item in page['results']]
+        while page['has_more']:
+            response = self.get({'since': page['cursor'], 'epoch': page['epoch']}, etag=first['ETag'])
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            seen += [item['id'] for item in page['results']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_edits_deletes_and_unfriend_require_resync(self):
+        record = self.record(10)
+        data = self.get().json()
+        since = {'since': data['cursor'], 'epoch': data['epoch']}
+
+        # 新しい記録の追加だけなら差分で返る
+        self.record(5)
+        delta = self.get(since).json()
+        self.assertFalse(delta['reset'])
+        self.assertEqual(len(delta['results']), 1)
+
+        since = {'since': delta['cursor'], 'epoch': delta['epoch']}
+        record.diary = '走った'
+        record.save()
+        resync = self.get(since).json()
+        self.assertTrue(resync['reset'])
+        self.assertEqual(resync['results'][0]['diary'], '走った')
+
+        since = {'since': resync['cursor'], 'epoch': resync['epoch']}
+        Friend.objects.get().delete()
+        resync = self.get(since).json()
+        self.assertTrue(resync['reset'])
+        self.assertEqual(resync['results'], [])
+
+
+@override_settings(LIVE_MAX_CONNECTIONS_PER_USER=1, LIVE_HEARTBEAT_SECONDS=1)
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        # 設定を変えたブローカーを作り直す
+        pubsub._broker = None
+        self.addCleanup(setattr, pubsub, '_broker', None)
+        self.user = User.objects.create(username='runner')
+        self.friend = User.objects.create(username='friend')
+
+    def test_not_streamed_under_wsgi(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('feed:live')).status_code, 204)
+        self.assertNotContains(self.client.get(reverse('friends_exercise_records')), 'EventSource')
+        self.assertEqual(pubsub.get_broker()._count, 0)
+
+    async def test_connection_limit_and_unsubscribe(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('feed:live')
+
+        first = await self.async_client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((await self.async_client.get(url)).status_code, 429)
+
+        # 本文を読む前に閉じても購読は解除される
+        first.close()
+        self.assertEqual(pubsub.get_broker()._count, 0)
+        second = await self.async_client.get(url)
+        self.assertEqual(second.status_code, 200)
+        second.close()
+
+    async def test_friends_made_mid_stream_are_picked_up(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('feed:live'))
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+        # 運動中の人とフレンドになると、その人の開始イベントが届く
+        self.friend.last_exercise_time = timezone.now()
+        await self.friend.asave()
+        await sync_to_async(Friend.objects.create)(user1=self.user, user2=self.friend)
+        live.publish_friends_changed([self.user.pk, self.friend.pk])
+        self.assertIn(live.STARTED.encode(), await anext(stream))
+
+        # 以降はそのフレンドのイベントも購読している
+        live.publish(self.friend.pk, live.started_event(self.friend, timezone.now()))
+        self.assertIn(b'"username": "friend"', await anext(stream))
+        response.close()
+        self.assertEqual(pubsub.get_broker()._count, 0)
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = "feed"
+
+urlpatterns = [
+    path("live/", views.friend_activity_stream, name="live"),
+    path("friends.json", views.friend_feed_json, name="friend_feed_json"),
+]
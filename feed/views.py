@@ -0,0 +1,150 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+
+from accounts.models import User
+from exerciseRecord.pagination import decode_cursor, encode_cursor
+from friend.cache import cached_friend_ids
+from friend.services import friend_ids
+from . import live, services
+from .consts import FEED_ITEMS
+from .pubsub import TooManyConnections, get_broker
+
+
+def _state(request):
+    # ETag と Last-Modified で同じ行を使い回す
+    if not hasattr(request, '_timeline_state'):
+        request._timeline_state = services.timeline_state(request.user)
+    return request._timeline_state
+
+
+def _since(request):
+    """
+    差分同期のカーソル
+    クライアントの epoch が今の epoch と違う場合は None（最新分から取り直させる）
+    """
+    if request.GET.get('epoch') != str(_state(request).epoch):
+        return None
+    return decode_cursor(request.GET.get('since'))
+
+
+def _feed_etag(request):
+    # 返す内容は版と、どこから返すか（since・epoch）で決まる
+    return f"{request.user.pk}-{_state(request).version}-{request.GET.get('epoch', '')}-{request.GET.get('since', '')}"
+
+
+def _feed_last_modified(request):
+    # If-Modified-Since だけでは since ごとの違いを表せないので、続きの取得では使わない
+    if request.GET.get('since'):
+        return None
+    return _state(request).updated_at
+
+
+def _entry_to_dict(entry):
+    record = entry.record
+    return {
+        'id': record.pk,
+        'user_id': record.user_id,
+        'username': record.user.username,
+        'exercise_start_time': record.exercise_start_time.isoformat(),
+        'exercise_end_time': record.exercise_end_time.isoformat(),
+        'duration_minutes': record.duration_minutes,
+        'diary': record.diary,
+        'created_at': record.created_at.isoformat(),
+    }
+
+
+@login_required
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def friend_feed_json(request):
+    """
+    フレンドの運動記録（差分同期用JSON）
+    ?since=前回の cursor&epoch=前回の epoch でそれより新しい記録だけを古い順に返す
+    has_more が true の間は返された cursor で続けて取得する
+
+    日記の更新・記録の削除・過去記録の取り込み・フレンド解除は追加としては返せないため epoch が進む
+    epoch が前回と違う場合は since を無視して最新分を返し reset を true にする
+    （クライアントは手元の記録を捨てて入れ替える）
+    タイムラインが変わっていなければ 304 Not Modified（本文は作らない）
+    """
+    since = _since(request)
+    entries, has_more = services.timeline_since(request.user, since, FEED_ITEMS)
+    if entries:
+        cursor = encode_cursor(entries[-1])
+    else:
+        cursor = request.GET.get('since') if since is not None else None
+
+    return JsonResponse({
+        'results': [_entry_to_dict(entry) for entry in entries],
+        'cursor': cursor,
+        'epoch': _state(request).epoch,
+        'reset': since is None,
+        'has_more': has_more,
+    })
+
+
+def _exercising_friends(user_ids):
+    """
+    今運動中のフレンド（接続時に最初に送る）
+    """
+    return list(
+        User.objects
+        .filter(pk__in=user_ids, last_exercise_time__isnull=False)
+        .values_list('pk', 'username', 'last_exercise_time')
+    )
+
+
+@login_required
+async def friend_activity_stream(request):
+    """
+    フレンドの運動開始・終了を Server-Sent Events で配信
+    ASGI（config.asgi）で動かす前提。ORMはすべてスレッドに逃がしてイベントループを止めない
+    WSGIでは 204 を返す（EventSource は 204 を受け取ると再接続しない）
+    """
+    if not live.available(request):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    ids = await sync_to_async(cached_friend_ids)(user)
+
+    try:
+        subscription = get_broker().subscribe(user.pk, live.channels_for(user.pk, ids))
+    except TooManyConnections as e:
+        response = HttpResponse(str(e), status=429)
+        response['Retry-After'] = str(settings.LIVE_HEARTBEAT_SECONDS)
+        return response
+
+    exercising = await sync_to_async(_exercising_friends)(ids)
+
+    async def events():
+        try:
+            # 再接続の間隔（ミリ秒）
+            yield f"retry: {settings.LIVE_HEARTBEAT_SECONDS * 1000}\n\n"
+            for pk, username, started_at in exercising:
+                yield live.format_sse(live.started_event(User(pk=pk, username=username), started_at))
+            while True:
+                event = await subscription.get(settings.LIVE_HEARTBEAT_SECONDS)
+                if event is None:
+                    # コメント行で接続を維持する
+                    yield ": heartbeat\n\n"
+                elif event['type'] == live.FRIENDS_CHANGED:
+                    # 接続中にフレンドが増減したら購読し直す（キャッシュの破棄を待たずDBから読む）
+                    # 新しいフレンドが運動中ならそれも送る
+                    current = await sync_to_async(friend_ids)(user.pk)
+                    added = set(current) - subscription.channels
+                    subscription.update(live.channels_for(user.pk, current))
+                    for pk, username, started_at in await sync_to_async(_exercising_friends)(added):
+                        yield live.format_sse(live.started_event(User(pk=pk, username=username), started_at))
+                else:
+                    yield live.format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    # 本文を読み始める前に切断された場合もレスポンスを閉じた時に購読を解除する
+    response._resource_closers.append(subscription.close)
+    return response
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FriendConfig(AppConfig):
     name = 'friend'
+
+    def ready(self):
+        from . import signals  # noqa: F401
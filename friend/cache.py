@@ -0,0 +1,83 @@
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+
+from config import cache_versions
+from .consts import FRIEND_CACHE_TTL
+from .models import FriendRequest
+from .services import friend_ids, friends_of
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def stats():
+    """
+    このプロセスのヒット・ミス数
+    """
+    with _counters_lock:
+        return dict(_counters)
+
+
+def _version_key(user_id):
+    return f"friend:v:{user_id}"
+
+
+def bump(user_ids):
+    """
+    ユーザーのキャッシュの版を進めて、古いキャッシュを読まれないようにする
+    """
+    cache_versions.bump(_version_key(user_id) for user_id in user_ids)
+
+
+def bump_on_commit(user_ids):
+    cache_versions.bump_on_commit(_version_key(user_id) for user_id in user_ids)
+
+
+def _cached(kind, user_id, compute):
+    key = f"friend:{kind}:{user_id}:{cache_versions.get_version(_version_key(user_id))}"
+    value = cache.get(key)
+    if value is not None:
+        _count(f"{kind}.hit")
+        return value
+    _count(f"{kind}.miss")
+    value = compute()
+    cache.set(key, value, FRIEND_CACHE_TTL)
+    return value
+
+
+def cached_friend_ids(user):
+    """
+    フレンドのユーザーID一覧（キャッシュ）
+    """
+    return _cached('ids', user.pk, lambda: friend_ids(user))
+
+
+def cached_friends(user):
+    """
+    フレンド一覧の表示用データ（キャッシュ）
+    """
+    return _cached('list', user.pk, lambda: [
+        {
+            'user': {'id': friend.pk, 'username': friend.username},
+            'friend_id': friend.friendship_id,
+            'created_at': friend.friends_since,
+        }
+        for friend in friends_of(user)
+    ])
+
+
+def cached_request_counts(user):
+    """
+    保留中のフレンド申請の件数（受け取った・送った）（キャッシュ）
+    """
+    return _cached('requests', user.pk, lambda: {
+        'received': FriendRequest.objects.filter(to_user=user).count(),
+        'sent': FriendRequest.objects.filter(from_user=user).count(),
+    })
@@ -0,0 +1,8 @@
+# ユーザー検索の1ページあたりの件数
+SEARCH_PAGE_SIZE = 20
+# 検索語が空の時に表示する件数
+SEARCH_DEFAULT_LIMIT = 5
+# フレンド関連のキャッシュ保持時間（秒）
+FRIEND_CACHE_TTL = 60 * 60 * 24
+# 「知り合いかも」の候補をユーザーごとに保持する件数
+SUGGESTION_LIMIT = 20
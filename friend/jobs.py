@@ -0,0 +1,15 @@
+from jobs.queue import handler
+from . import suggestions
+
+REFRESH_SUGGESTIONS = 'friend.refresh_suggestions'
+
+
+@handler(REFRESH_SUGGESTIONS, batch_size=20)
+def refresh_suggestions(payloads):
+    """
+    フレンド関係が変わった2人の「知り合いかも」を差分更新
+    同じ2人の変化が複数たまっていても1回だけ数え直す
+    """
+    pairs = {(payload['user_id'], payload['other_id']) for payload in payloads}
+    for user_id, other_id in sorted(pairs):
+        suggestions.refresh_pair(user_id, other_id)
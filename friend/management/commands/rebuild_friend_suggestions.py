@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from friend import suggestions
+from friend.consts import SUGGESTION_LIMIT
+
+
+class Command(BaseCommand):
+    help = "「知り合いかも」の候補（共通フレンド数）を作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=SUGGESTION_LIMIT,
+            help="ユーザー1人あたりに保持する候補の件数",
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="対象ユーザー名（複数指定可、省略時は全ユーザーをまとめて計算）",
+        )
+
+    def handle(self, *args, limit, usernames, **options):
+        if usernames:
+            user_ids = User.objects.filter(username__in=usernames).values_list('pk', flat=True)
+            count = 0
+            for user_id in user_ids:
+                suggestions.refresh_user(user_id, limit=limit)
+                count += 1
+        else:
+            count = suggestions.rebuild_all(limit=limit)
+
+        self.stdout.write(self.style.SUCCESS(f"{count}人の候補を作り直しました"))
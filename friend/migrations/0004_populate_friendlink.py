@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def populate_links(apps, schema_editor):
+    """
+    既存のFriendから両方向のFriendLinkを作成
+    """
+    Friend = apps.get_model('friend', 'Friend')
+    FriendLink = apps.get_model('friend', 'FriendLink')
+
+    links = []
+    for friendship in Friend.objects.all().iterator():
+        if friendship.user1_id == friendship.user2_id:
+            continue
+        links.append(FriendLink(
+            user_id=friendship.user1_id,
+            friend_id=friendship.user2_id,
+            friendship_id=friendship.pk,
+            created_at=friendship.created_at,
+        ))
+        links.append(FriendLink(
+            user_id=friendship.user2_id,
+            friend_id=friendship.user1_id,
+            friendship_id=friendship.pk,
+            created_at=friendship.created_at,
+        ))
+    # A→B と B→A の2つのFriendがある場合は先に作られた方を残す
+    FriendLink.objects.bulk_create(links, batch_size=500, ignore_conflicts=True)
+
+
+def clear_links(apps, schema_editor):
+    apps.get_model('friend', 'FriendLink').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friend', '0003_friendlink'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_links, clear_links),
+    ]
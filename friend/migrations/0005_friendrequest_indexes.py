@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_requests(apps, schema_editor):
+    """
+    同じ相手への重複した申請を、最初の1件を残して削除
+    """
+    FriendRequest = apps.get_model('friend', 'FriendRequest')
+    duplicates = (
+        FriendRequest.objects
+        .values('from_user_id', 'to_user_id')
+        .annotate(first_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        FriendRequest.objects.filter(
+            from_user_id=row['from_user_id'],
+            to_user_id=row['to_user_id'],
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friend', '0004_populate_friendlink'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_requests, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(fields=['to_user', '-created_at'], name='friendrequest_to_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendrequest',
+            index=models.Index(fields=['from_user', '-created_at'], name='friendrequest_from_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendrequest',
+            constraint=models.UniqueConstraint(fields=('from_user', 'to_user'), name='friendrequest_from_to_uniq'),
+        ),
+    ]
@@ -14,6 +14,16 @@ class FriendRequest(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['from_user', 'to_user'], name='friendrequest_from_to_uniq'),
+        ]
+        indexes = [
+            # 受け取った申請・送った申請の一覧（新しい順）用
+            models.Index(fields=['to_user', '-created_at'], name='friendrequest_to_created_idx'),
+            models.Index(fields=['from_user', '-created_at'], name='friendrequest_from_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.from_user} → {self.to_user}"
 
@@ -34,4 +44,68 @@ class Friend(models.Model):
         unique_together = ('user1', 'user2')
 
     def __str__(self):
-        return f"{self.user1} & {self.user2}"
\ No newline at end of file
+        return f"{self.user1} & {self.user2}"
+
+
+class FriendLink(models.Model):
+    """
+    フレンド関係の隣接リスト（1つのFriendにつき2行）
+    user から見たフレンド friend を1行で持ち、
+    どちらの向きの検索も (user, friend) インデックス1回で済むようにする
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='friend_links',
+        on_delete=models.CASCADE
+    )
+    friend = models.ForeignKey(
+        User,
+        related_name='reverse_friend_links',
+        on_delete=models.CASCADE
+    )
+    friendship = models.ForeignKey(
+        Friend,
+        related_name='links',
+        on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'friend'], name='friendlink_user_friend_uniq'),
+            models.CheckConstraint(condition=~models.Q(user=models.F('friend')), name='friendlink_not_self'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} → {self.friend}"
+
+
+class FriendSuggestion(models.Model):
+    """
+    「知り合いかも」の候補（共通フレンド数つき、ユーザーごとに上位 SUGGESTION_LIMIT 件まで）
+    friend.suggestions でフレンド関係の変化に合わせて更新する
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='friend_suggestions',
+        on_delete=models.CASCADE
+    )
+    candidate = models.ForeignKey(
+        User,
+        related_name='suggested_to',
+        on_delete=models.CASCADE
+    )
+    mutual_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='friendsuggestion_user_candidate_uniq'),
+        ]
+        indexes = [
+            # 候補一覧（共通フレンドが多い順）用
+            models.Index(fields=['user', '-mutual_count', 'candidate'], name='friendsuggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ← {self.candidate} ({self.mutual_count})"
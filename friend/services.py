@@ -0,0 +1,228 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+
+from accounts.models import User
+from accounts.search import search_users
+from .models import Friend, FriendLink, FriendRequest
+
+# フレンド申請の処理結果
+SENT = "sent"
+ACCEPTED = "accepted"
+SELF = "self"
+ALREADY_FRIENDS = "already_friends"
+ALREADY_SENT = "already_sent"
+NOT_FOUND = "not_found"
+
+
+def are_friends(user, other):
+    """
+    2人がフレンドかどうか（(user, friend) ユニークインデックスの1回の検索）
+    """
+    return FriendLink.objects.filter(user=user, friend=other).exists()
+
+
+def friend_ids(user):
+    """
+    フレンドのユーザーID一覧
+    """
+    return list(FriendLink.objects.filter(user=user).values_list('friend_id', flat=True))
+
+
+def friends_of(user):
+    """
+    フレンドのユーザー一覧
+    friendship_id（Friendのid）と friends_since（フレンドになった日時）を付与する
+    """
+    return (
+        User.objects
+        .filter(reverse_friend_links__user=user)
+        .annotate(
+            friendship_id=F('reverse_friend_links__friendship_id'),
+            friends_since=F('reverse_friend_links__created_at'),
+        )
+        .order_by('reverse_friend_links__created_at')
+    )
+
+
+def annotate_relationship(users, user):
+    """
+    ユーザーのquerysetに user との関係を付与する
+    is_friend: フレンドかどうか
+    outgoing_request_id: user が送った申請のid（なければNone）
+    incoming_request_id: user が受け取った申請のid（なければNone）
+    """
+    return users.annotate(
+        is_friend=Exists(
+            FriendLink.objects.filter(user=user, friend=OuterRef('pk'))
+        ),
+        outgoing_request_id=Subquery(
+            FriendRequest.objects
+            .filter(from_user=user, to_user=OuterRef('pk'))
+            .values('id')[:1]
+        ),
+        incoming_request_id=Subquery(
+            FriendRequest.objects
+            .filter(from_user=OuterRef('pk'), to_user=user)
+            .values('id')[:1]
+        ),
+    )
+
+
+def search_candidates(user, query, mode):
+    """
+    ユーザー検索の結果（自分以外、user との関係つき）
+    """
+    return annotate_relationship(search_users(query, mode).exclude(id=user.id), user)
+
+
+def received_requests(user):
+    """
+    受け取ったフレンド申請（新しい順、送った人つき）
+    """
+    return FriendRequest.objects.filter(to_user=user).select_related('from_user').order_by('-created_at')
+
+
+def sent_requests(user):
+    """
+    送ったフレンド申請（新しい順、送った相手つき）
+    """
+    return FriendRequest.objects.filter(from_user=user).select_related('to_user').order_by('-created_at')
+
+
+def friendships_of(user):
+    """
+    user が含まれるフレンド関係（Friend）一覧
+    """
+    return Friend.objects.filter(links__user=user)
+
+
+def link_friendship(friendship):
+    """
+    Friendに対応する両方向のFriendLinkを作成
+    逆向きのFriendが既にある場合（既にフレンド）はFriendLinkを作らない
+    """
+    FriendLink.objects.bulk_create([
+        FriendLink(
+            user_id=friendship.user1_id,
+            friend_id=friendship.user2_id,
+            friendship=friendship,
+            created_at=friendship.created_at,
+        ),
+        FriendLink(
+            user_id=friendship.user2_id,
+            friend_id=friendship.user1_id,
+            friendship=friendship,
+            created_at=friendship.created_at,
+        ),
+    ], ignore_conflicts=True)
+
+
+def send_request(from_user, to_user_id):
+    """
+    フレンド申請を送る
+    相手の状態（フレンドか・申請済みか・相手から申請が来ているか）を1回のクエリで読み、
+    通常は申請の INSERT 1回で終わる。同時に送られた場合はユニーク制約で弾く。
+    相手から申請が来ている場合はそれを承認する。
+
+    戻り値: (結果, 相手のユーザー)  相手がいない場合は (NOT_FOUND, None)
+    """
+    to_user = annotate_relationship(User.objects.filter(pk=to_user_id), from_user).first()
+    if to_user is None:
+        return NOT_FOUND, None
+    if to_user.pk == from_user.pk:
+        return SELF, to_user
+    if to_user.is_friend:
+        return ALREADY_FRIENDS, to_user
+    if to_user.incoming_request_id is not None:
+        status, _ = accept_request(from_user, to_user.incoming_request_id)
+        if status == ACCEPTED:
+            return ACCEPTED, to_user
+        if status == ALREADY_FRIENDS:
+            return ALREADY_FRIENDS, to_user
+        # 相手の申請が直前に取り消された場合は通常の申請として送る
+    if to_user.outgoing_request_id is not None:
+        return ALREADY_SENT, to_user
+
+    try:
+        with transaction.atomic():
+            FriendRequest.objects.create(from_user=from_user, to_user=to_user)
+    except IntegrityError:
+        return ALREADY_SENT, to_user
+    return SENT, to_user
+
+
+def accept_request(user, request_id):
+    """
+    受け取ったフレンド申請を承認する
+    申請の削除とフレンド関係の作成を1つのトランザクションで行う。
+    - 同時に承認された場合: 申請を削除できた方だけがフレンド関係を作る
+    - お互いに申請していた場合: FriendLink のユニーク制約で2つ目を弾く
+
+    戻り値: (結果, フレンド申請)  申請がない場合は (NOT_FOUND, None)
+    """
+    friend_request = (
+        FriendRequest.objects
+        .select_related('from_user')
+        .filter(pk=request_id, to_user=user)
+        .first()
+    )
+    if friend_request is None:
+        return NOT_FOUND, None
+
+    try:
+        with transaction.atomic():
+            deleted, _ = FriendRequest.objects.filter(pk=friend_request.pk).delete()
+            if not deleted:
+                return NOT_FOUND, friend_request
+            # 逆向きの申請も不要になるので削除
+            FriendRequest.objects.filter(from_user=user, to_user_id=friend_request.from_user_id).delete()
+            friendship = Friend.objects.create(user1_id=friend_request.from_user_id, user2=user)
+            # 逆向きのFriendが既にあるとFriendLinkは作られない
+            if not friendship.links.exists():
+                raise IntegrityError("既にフレンドです")
+    except IntegrityError:
+        # 既にフレンドだった（同時に逆向きの申請が承認された）
+        FriendRequest.objects.filter(pk=friend_request.pk).delete()
+        return ALREADY_FRIENDS, friend_request
+    return ACCEPTED, friend_request
+
+
+def _delete_request(**lookup):
+    friend_request = FriendRequest.objects.select_related('from_user', 'to_user').filter(**lookup).first()
+    if friend_request is None:
+        return None
+    deleted, _ = FriendRequest.objects.filter(pk=friend_request.pk).delete()
+    return friend_request if deleted else None
+
+
+def reject_request(user, request_id):
+    """
+    受け取ったフレンド申請を拒否する
+    戻り値: 削除した申請（なければ None）
+    """
+    return _delete_request(pk=request_id, to_user=user)
+
+
+def cancel_request(user, request_id):
+    """
+    送ったフレンド申請を取り消す
+    戻り値: 削除した申請（なければ None）
+    """
+    return _delete_request(pk=request_id, from_user=user)
+
+
+def remove_friend(user, friendship_id):
+    """
+    フレンドを解除する
+    戻り値: 相手のユーザー（フレンドでなければ None）
+    """
+    link = (
+        FriendLink.objects
+        .select_related('friend')
+        .filter(user=user, friendship_id=friendship_id)
+        .first()
+    )
+    if link is None:
+        return None
+    Friend.objects.filter(pk=friendship_id).delete()
+    return link.friend
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Friend, FriendRequest
+from jobs.queue import enqueue
+from . import cache, services
+from .jobs import REFRESH_SUGGESTIONS
+
+
+@receiver(post_save, sender=Friend)
+def link_on_friend_create(sender, instance, created, raw=False, **kwargs):
+    """
+    フレンド関係の作成時に両方向のFriendLinkを作成
+    （削除はFriendLink.friendshipのCASCADEで行われる）
+    """
+    if raw or not created:
+        return
+    services.link_friendship(instance)
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def invalidate_cache_on_friend_change(sender, instance, raw=False, **kwargs):
+    """
+    フレンド関係が変わったら2人のキャッシュを破棄
+    """
+    if raw:
+        return
+    cache.bump_on_commit([instance.user1_id, instance.user2_id])
+
+
+@receiver(post_save, sender=Friend)
+def refresh_suggestions_on_friend_create(sender, instance, created, raw=False, **kwargs):
+    """
+    フレンド関係の作成時に「知り合いかも」の候補を差分更新（ジョブで実行）
+    """
+    if raw or not created:
+        return
+    enqueue(REFRESH_SUGGESTIONS, {'user_id': instance.user1_id, 'other_id': instance.user2_id})
+
+
+@receiver(post_delete, sender=Friend)
+def refresh_suggestions_on_friend_delete(sender, instance, **kwargs):
+    """
+    フレンド関係の削除時に「知り合いかも」の候補を差分更新（ジョブで実行）
+    """
+    enqueue(REFRESH_SUGGESTIONS, {'user_id': instance.user1_id, 'other_id': instance.user2_id})
+
+
+@receiver(post_save, sender=FriendRequest)
+@receiver(post_delete, sender=FriendRequest)
+def invalidate_cache_on_request_change(sender, instance, raw=False, **kwargs):
+    """
+    フレンド申請が変わったら2人のキャッシュを破棄
+    """
+    if raw:
+        return
+    cache.bump_on_commit([instance.from_user_id, instance.to_user_id])
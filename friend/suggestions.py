@@ -0,0 +1,184 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from accounts.models import User
+from .consts import SUGGESTION_LIMIT
+from .models import FriendLink, FriendSuggestion
+from .services import annotate_relationship
+
+
+def _friends(user_id):
+    return FriendLink.objects.filter(user_id=user_id).values('friend_id')
+
+
+def compute_suggestions(user_id, limit=SUGGESTION_LIMIT):
+    """
+    フレンドのフレンドを共通フレンド数の多い順に数える（FriendLinkの自己結合1回）
+    戻り値: [(candidate_id, mutual_count), ...]
+    """
+    friends = _friends(user_id)
+    rows = (
+        FriendLink.objects
+        .filter(user_id__in=friends)
+        .exclude(friend_id=user_id)
+        .exclude(friend_id__in=friends)
+        .values('friend_id')
+        .annotate(mutual=Count('id'))
+        .order_by('-mutual', 'friend_id')[:limit]
+    )
+    return [(row['friend_id'], row['mutual']) for row in rows]
+
+
+def _replace(user_id, suggestions):
+    FriendSuggestion.objects.filter(user_id=user_id).delete()
+    FriendSuggestion.objects.bulk_create([
+        FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=count)
+        for candidate_id, count in suggestions
+    ])
+
+
+def refresh_user(user_id, limit=SUGGESTION_LIMIT):
+    """
+    1人分の候補を作り直す
+    """
+    with transaction.atomic():
+        _replace(user_id, compute_suggestions(user_id, limit))
+
+
+def _update_candidate(candidate_id, via_id):
+    """
+    via のフレンドそれぞれについて、候補 candidate との共通フレンド数を数え直す
+    via と candidate のフレンド関係が変わった時、影響を受けるのはこの組だけ
+    戻り値: 更新したユーザーIDの集合
+    """
+    user_ids = set(
+        FriendLink.objects
+        .filter(user_id=via_id)
+        .exclude(friend_id=candidate_id)
+        .values_list('friend_id', flat=True)
+    )
+    if not user_ids:
+        return set()
+
+    # すでに candidate とフレンドの人には候補として出さない
+    already = set(
+        FriendLink.objects
+        .filter(user_id=candidate_id, friend_id__in=user_ids)
+        .values_list('friend_id', flat=True)
+    )
+    counts = dict(
+        FriendLink.objects
+        .filter(user_id__in=user_ids - already, friend_id__in=_friends(candidate_id))
+        .values('user_id')
+        .annotate(mutual=Count('id'))
+        .values_list('user_id', 'mutual')
+    )
+
+    FriendSuggestion.objects.filter(
+        candidate_id=candidate_id,
+        user_id__in=user_ids - set(counts),
+    ).delete()
+    FriendSuggestion.objects.bulk_create(
+        [
+            FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=count)
+            for user_id, count in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'candidate'],
+        update_fields=['mutual_count', 'updated_at'],
+    )
+    return set(counts)
+
+
+def _trim(user_ids, limit=SUGGESTION_LIMIT):
+    """
+    各ユーザーの候補を上位 limit 件に切り詰める
+    """
+    overflow = (
+        FriendSuggestion.objects
+        .filter(user_id__in=user_ids)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('user_id'),
+            order_by=[F('mutual_count').desc(), F('candidate_id').asc()],
+        ))
+        .filter(position__gt=limit)
+        .values_list('id', flat=True)
+    )
+    FriendSuggestion.objects.filter(id__in=list(overflow)).delete()
+
+
+def refresh_pair(user_id, other_id):
+    """
+    2人のフレンド関係が作成・削除された時の差分更新
+    - 2人自身の候補は作り直す
+    - 片方のフレンドから見た、もう片方との共通フレンド数だけ数え直す
+    フレンドの人数によらず発行するクエリ数は一定
+
+    上位 SUGGESTION_LIMIT 件に入っていなかった候補の順位の繰り上がりまでは追わないため、
+    定期的に rebuild_friend_suggestions で全体を作り直す
+    """
+    existing = set(User.objects.filter(pk__in=[user_id, other_id]).values_list('pk', flat=True))
+    with transaction.atomic():
+        touched = set()
+        for candidate_id, via_id in ((other_id, user_id), (user_id, other_id)):
+            if candidate_id in existing and via_id in existing:
+                touched |= _update_candidate(candidate_id, via_id)
+        if touched:
+            _trim(touched)
+        for pk in existing:
+            _replace(pk, compute_suggestions(pk))
+
+
+def rebuild_all(limit=SUGGESTION_LIMIT, batch_size=500):
+    """
+    全ユーザーの候補をまとめて作り直す
+    FriendLinkを1回だけ読み、メモリ上の隣接リストでフレンドのフレンドを数える
+    戻り値: 候補を持つユーザー数
+    """
+    graph = defaultdict(set)
+    for user_id, friend_id in FriendLink.objects.values_list('user_id', 'friend_id').iterator():
+        graph[user_id].add(friend_id)
+
+    user_ids = list(graph)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        suggestions = []
+        for user_id in batch:
+            friends = graph[user_id]
+            counts = Counter(
+                candidate_id
+                for friend_id in friends
+                for candidate_id in graph[friend_id]
+                if candidate_id != user_id and candidate_id not in friends
+            )
+            top = heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))
+            suggestions.extend(
+                FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=count)
+                for candidate_id, count in top
+            )
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(user_id__in=batch).delete()
+            FriendSuggestion.objects.bulk_create(suggestions)
+
+    # フレンドがいなくなったユーザーの候補を消す
+    FriendSuggestion.objects.exclude(user_id__in=FriendLink.objects.values('user_id')).delete()
+    return len(user_ids)
+
+
+def suggestions_for(user):
+    """
+    user への候補一覧（共通フレンド数 mutual_count と申請状態つき）
+    friend_suggestions の (user, -mutual_count, candidate) インデックスで1回のクエリ
+    """
+    return annotate_relationship(
+        User.objects
+        .filter(suggested_to__user=user)
+        .annotate(mutual_count=F('suggested_to__mutual_count'))
+        .order_by('-mutual_count', 'pk'),
+        user,
+    )
@@ -1,3 +1,273 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from jobs.worker import run_pending
+from . import cache as friend_cache, services, suggestions
+from .models import Friend, FriendLink, FriendRequest, FriendSuggestion
+
+
+class FriendLinkTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def links(self):
+        return sorted(FriendLink.objects.values_list('user__username', 'friend__username'))
+
+    def test_links_are_symmetric(self):
+        friendship = Friend.objects.create(user1=self.alice, user2=self.bob)
+        self.assertEqual(self.links(), [('alice', 'bob'), ('bob', 'alice')])
+        self.assertEqual(services.friend_ids(self.alice), [self.bob.pk])
+        self.assertEqual(services.friend_ids(self.bob), [self.alice.pk])
+
+        self.assertEqual(services.remove_friend(self.bob, friendship.pk), self.alice)
+        self.assertEqual(self.links(), [])
+        self.assertFalse(services.are_friends(self.alice, self.bob))
+
+    def test_reversed_duplicate_friendship_adds_no_links(self):
+        Friend.objects.create(user1=self.alice, user2=self.bob)
+        duplicate = Friend.objects.create(user1=self.bob, user2=self.alice)
+
+        self.assertEqual(self.links(), [('alice', 'bob'), ('bob', 'alice')])
+        duplicate.delete()
+        self.assertTrue(services.are_friends(self.alice, self.bob))
+
+
+class FriendCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def test_friend_changes_invalidate_both_users(self):
+        self.assertEqual(friend_cache.cached_friend_ids(self.alice), [])
+        self.assertEqual(friend_cache.cached_friends(self.bob), [])
+        with self.assertNumQueries(0):
+            friend_cache.cached_friend_ids(self.alice)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship = Friend.objects.create(user1=self.alice, user2=self.bob)
+        self.assertEqual(friend_cache.cached_friend_ids(self.alice), [self.bob.pk])
+        self.assertEqual(
+            [friend['user']['username'] for friend in friend_cache.cached_friends(self.bob)], ['alice'],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship.delete()
+        self.assertEqual(friend_cache.cached_friend_ids(self.bob), [])
+        self.assertEqual(friend_cache.cached_friends(self.alice), [])
+
+    def test_request_changes_invalidate_counts(self):
+        self.assertEqual(friend_cache.cached_request_counts(self.bob), {'received': 0, 'sent': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.send_request(self.alice, self.bob.pk)
+        self.assertEqual(friend_cache.cached_request_counts(self.bob), {'received': 1, 'sent': 0})
+        self.assertEqual(friend_cache.cached_request_counts(self.alice), {'received': 0, 'sent': 1})
+
+        request = FriendRequest.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reject_request(self.bob, request.pk)
+        self.assertEqual(friend_cache.cached_request_counts(self.bob), {'received': 0, 'sent': 0})
+        self.assertEqual(friend_cache.cached_request_counts(self.alice), {'received': 0, 'sent': 0})
+
+    def test_rolled_back_change_keeps_the_cache(self):
+        friend_cache.cached_friend_ids(self.alice)
+        # コミットされなかった変更では版は進まない
+        with self.captureOnCommitCallbacks(execute=False):
+            Friend.objects.create(user1=self.alice, user2=self.bob)
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_cache.cached_friend_ids(self.alice), [])
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.me = User.objects.create(username='me')
+        self.client.force_login(self.me)
+        # ログインユーザーのキャッシュを温めておく（1回目だけユーザーを読むため）
+        self.client.get(reverse('friend:user_search'))
+
+    def make_users(self, count, prefix):
+        users = [User.objects.create(username=f'{prefix}{i}') for i in range(count)]
+        # フレンド・送った申請・受け取った申請を混ぜる
+        for i, user in enumerate(users):
+            if i % 3 == 0:
+                Friend.objects.create(user1=self.me, user2=user)
+            elif i % 3 == 1:
+                FriendRequest.objects.create(from_user=self.me, to_user=user)
+            else:
+                FriendRequest.objects.create(from_user=user, to_user=self.me)
+        return users
+
+    def search_query_count(self, query):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('friend:user_search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_result_size(self):
+        self.make_users(3, 'few')
+        self.make_users(30, 'many')
+
+        self.assertEqual(self.search_query_count('few'), self.search_query_count('many'))
+
+    def test_relationship_state(self):
+        friend, outgoing, incoming = self.make_users(3, 'rel')
+
+        response = self.client.get(reverse('friend:user_search'), {'q': 'rel'})
+        users = {user.username: user for user in response.context['users']}
+
+        self.assertTrue(users['rel0'].is_friend)
+        self.assertEqual(
+            users['rel1'].outgoing_request_id,
+            FriendRequest.objects.get(from_user=self.me, to_user=outgoing).id
+        )
+        self.assertEqual(
+            users['rel2'].incoming_request_id,
+            FriendRequest.objects.get(from_user=incoming, to_user=self.me).id
+        )
+        self.assertNotIn('me', users)
+
+    def test_search_ranks_exact_and_prefix_matches_first(self):
+        for username in ['xrunner', 'runner', 'runner2', 'ru']:
+            User.objects.create(username=username)
+
+        response = self.client.get(reverse('friend:user_search'), {'q': 'runner'})
+        self.assertEqual(
+            [user.username for user in response.context['users']],
+            ['runner', 'runner2', 'xrunner']
+        )
+
+        response = self.client.get(reverse('friend:user_search'), {'q': 'runner', 'mode': 'prefix'})
+        self.assertEqual(
+            [user.username for user in response.context['users']],
+            ['runner', 'runner2']
+        )
+
+
+class FriendRequestWorkflowTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def assertFriendsOnce(self):
+        self.assertEqual(Friend.objects.count(), 1)
+        self.assertTrue(services.are_friends(self.alice, self.bob))
+        self.assertTrue(services.are_friends(self.bob, self.alice))
+        self.assertFalse(FriendRequest.objects.exists())
+
+    def test_send_request_once(self):
+        self.assertEqual(services.send_request(self.alice, self.bob.pk)[0], services.SENT)
+        self.assertEqual(services.send_request(self.alice, self.bob.pk)[0], services.ALREADY_SENT)
+        self.assertEqual(FriendRequest.objects.count(), 1)
+
+    def test_send_request_to_self_or_missing_user(self):
+        self.assertEqual(services.send_request(self.alice, self.alice.pk)[0], services.SELF)
+        self.assertEqual(services.send_request(self.alice, 0), (services.NOT_FOUND, None))
+
+    def test_reverse_pending_request_is_accepted(self):
+        services.send_request(self.bob, self.alice.pk)
+
+        self.assertEqual(services.send_request(self.alice, self.bob.pk)[0], services.ACCEPTED)
+        self.assertFriendsOnce()
+
+    def test_concurrent_send_hits_unique_constraint(self):
+        # 状態を読んだ直後に別のリクエストが同じ申請を作った場合
+        stale = services.annotate_relationship(User.objects.filter(pk=self.bob.pk), self.alice).first()
+        FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+
+        with mock.patch.object(services, 'annotate_relationship') as annotate:
+            annotate.return_value.first.return_value = stale
+            status, _ = services.send_request(self.alice, self.bob.pk)
+
+        self.assertEqual(status, services.ALREADY_SENT)
+        self.assertEqual(FriendRequest.objects.count(), 1)
+
+    def test_double_accept_creates_one_friendship(self):
+        FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+        request_id = FriendRequest.objects.get().pk
+
+        self.assertEqual(services.accept_request(self.bob, request_id)[0], services.ACCEPTED)
+        self.assertEqual(services.accept_request(self.bob, request_id)[0], services.NOT_FOUND)
+        self.assertFriendsOnce()
+
+    def test_crossed_requests_create_one_friendship(self):
+        to_bob = FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+        to_alice = FriendRequest.objects.create(from_user=self.bob, to_user=self.alice)
+
+        self.assertEqual(services.accept_request(self.bob, to_bob.pk)[0], services.ACCEPTED)
+        self.assertEqual(services.accept_request(self.alice, to_alice.pk)[0], services.NOT_FOUND)
+        self.assertFriendsOnce()
+
+    def test_accept_when_already_friends_by_other_request(self):
+        # 逆向きの申請が同時に承認され、既にフレンドになっていた場合
+        Friend.objects.create(user1=self.bob, user2=self.alice)
+        to_bob = FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+
+        self.assertEqual(services.accept_request(self.bob, to_bob.pk)[0], services.ALREADY_FRIENDS)
+        self.assertFriendsOnce()
+
+    def test_accept_view_requires_post(self):
+        to_bob = FriendRequest.objects.create(from_user=self.alice, to_user=self.bob)
+        self.client.force_login(self.bob)
+
+        url = reverse('friend:accept_request', args=[to_bob.pk])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertRedirects(self.client.post(url), reverse('friend:friend_requests'))
+        self.assertFriendsOnce()
+
+
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        self.users = {name: User.objects.create(username=name) for name in 'abcdef'}
+
+    def befriend(self, first, second):
+        Friend.objects.create(user1=self.users[first], user2=self.users[second])
+        run_pending()
+
+    def snapshot(self):
+        return sorted(FriendSuggestion.objects.values_list('user_id', 'candidate_id', 'mutual_count'))
+
+    def test_incremental_matches_batch(self):
+        for pair in ['ab', 'ac', 'bd', 'cd', 'de', 'ef']:
+            self.befriend(*pair)
+        Friend.objects.get(user1=self.users['d'], user2=self.users['e']).delete()
+        run_pending()
+
+        incremental = self.snapshot()
+        suggestions.rebuild_all()
+        self.assertEqual(incremental, self.snapshot())
+
+        # a から見て d は b・c の2人が共通フレンド
+        a_list = [(user.username, user.mutual_count) for user in suggestions.suggestions_for(self.users['a'])]
+        self.assertEqual(a_list, [('d', 2)])
+
+    def test_friends_are_not_suggested(self):
+        self.befriend('a', 'b')
+        self.befriend('b', 'c')
+        self.assertTrue(FriendSuggestion.objects.filter(user=self.users['a'], candidate=self.users['c']).exists())
+
+        self.befriend('a', 'c')
+        self.assertFalse(FriendSuggestion.objects.filter(user=self.users['a'], candidate=self.users['c']).exists())
+
+    def test_view_query_count_does_not_depend_on_list_size(self):
+        self.client.force_login(self.users['a'])
+        url = reverse('friend:suggestions')
+        self.befriend('a', 'b')
+        self.befriend('b', 'c')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for name in 'def':
+            self.befriend('b', name)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
 
-# Create your tests here.
+        self.assertEqual(len(response.context['users']), 4)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
@@ -6,6 +6,7 @@ app_name = "friend"
 urlpatterns = [
     # path('', include("exerciseRecord.urls")),
     path("search/", views.user_search, name="user_search"),
+    path("suggestions/", views.friend_suggestions, name="suggestions"),
     path("friends/", views.friends_list, name="friends_list"),
     path('requests/', views.friend_requests, name='friend_requests'),
     path('sent_requests/', views.sent_requests, name='sent_requests'),
@@ -14,4 +15,5 @@ urlpatterns = [
     path("send_friend_request/<int:user_id>/",views.send_friend_request,name="send_friend_request"),
     path("cancel_friend_request/<int:request_id>/",views.cancel_friend_request,name="cancel_friend_request"),
     path("remove_friend/<int:friend_id>/",views.remove_friend,name="remove_friend"),
+    path("cache_stats/", views.cache_stats, name="cache_stats"),
 ]
\ No newline at end of file
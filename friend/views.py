@@ -1,115 +1,101 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from .models import FriendRequest, Friend
-from accounts.models import User
-from exerciseRecord.models import ExerciseRecord
-from django.urls import reverse_lazy
-from django.utils import timezone
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from django.core.paginator import Paginator
+from .consts import SEARCH_DEFAULT_LIMIT, SEARCH_PAGE_SIZE
+from . import services
+from . import cache as friend_cache
+from .cache import cached_friends, cached_request_counts
+from .suggestions import suggestions_for
+from accounts.search import CONTAINS, PREFIX
+from stats.models import UserActivityStats
 
 # Create your views here.
 @login_required
+@require_POST
 def send_friend_request(request, user_id):
     """
     フレンド申請を送る
+    相手からも申請が来ている場合はそのままフレンドになる
     """
-    to_user = get_object_or_404(User, id=user_id)
-    from_user = request.user
+    back = request.META.get('HTTP_REFERER', 'friend:user_search')
+    status, to_user = services.send_request(request.user, user_id)
 
+    if status == services.NOT_FOUND:
+        raise Http404
     # 自分自身には送れない
-    if from_user == to_user:
+    if status == services.SELF:
         messages.error(request, '自分自身にフレンド申請はできません')
-        return redirect(request.META.get('HTTP_REFERER', 'friend:user_search'))
-
-    # 既にフレンドかチェック
-    if Friend.objects.filter(
-        Q(user1=from_user, user2=to_user) | Q(user1=to_user, user2=from_user)
-    ).exists():
+    elif status == services.ALREADY_FRIENDS:
         messages.info(request, 'すでにフレンドです')
-        return redirect(request.META.get('HTTP_REFERER', 'friend:user_search'))
-
-    # 既に申請済みかチェック
-    if FriendRequest.objects.filter(from_user=from_user, to_user=to_user).exists():
+    elif status == services.ALREADY_SENT:
         messages.info(request, 'すでに申請済みです')
-        return redirect(request.META.get('HTTP_REFERER', 'friend:user_search'))
-
-    # フレンド申請を作成
-    FriendRequest.objects.create(from_user=from_user, to_user=to_user)
-    messages.success(request, f'{to_user.username}さんにフレンド申請を送りました')
-    return redirect(request.META.get('HTTP_REFERER', 'friend:user_search'))
+    elif status == services.ACCEPTED:
+        messages.success(request, f'{to_user.username}さんとフレンドになりました')
+    else:
+        messages.success(request, f'{to_user.username}さんにフレンド申請を送りました')
+    return redirect(back)
 
 @login_required
+@require_POST
 def accept_friend_request(request, request_id):
     """
     フレンド申請を承認
     """
-    friend_request = get_object_or_404(FriendRequest, id=request_id, to_user=request.user)
-
-    # フレンド関係を作成
-    Friend.objects.create(
-        user1=friend_request.from_user,
-        user2=friend_request.to_user
-    )
+    status, friend_request = services.accept_request(request.user, request_id)
 
-    # 申請を削除
-    friend_request.delete()
-
-    messages.success(request, f'{friend_request.from_user.username}さんとフレンドになりました')
+    if status == services.NOT_FOUND:
+        raise Http404
+    if status == services.ALREADY_FRIENDS:
+        messages.info(request, f'{friend_request.from_user.username}さんとはすでにフレンドです')
+    else:
+        messages.success(request, f'{friend_request.from_user.username}さんとフレンドになりました')
     return redirect('friend:friend_requests')
 
 
 @login_required
+@require_POST
 def reject_friend_request(request, request_id):
     """
     フレンド申請を拒否
     """
-    friend_request = get_object_or_404(FriendRequest, id=request_id, to_user=request.user)
-    from_user_name = friend_request.from_user.username
-
-    # 申請を削除
-    friend_request.delete()
+    friend_request = services.reject_request(request.user, request_id)
+    if friend_request is None:
+        raise Http404
 
-    messages.info(request, f'{from_user_name}さんからの申請を拒否しました')
+    messages.info(request, f'{friend_request.from_user.username}さんからの申請を拒否しました')
     return redirect('friend:friend_requests')
 
 
 @login_required
+@require_POST
 def cancel_friend_request(request, request_id):
     """
     送ったフレンド申請をキャンセル
     """
-    friend_request = get_object_or_404(FriendRequest, id=request_id, from_user=request.user)
-    to_user_name = friend_request.to_user.username
+    friend_request = services.cancel_request(request.user, request_id)
+    if friend_request is None:
+        raise Http404
 
-    # 申請を削除
-    friend_request.delete()
-
-    messages.info(request, f'{to_user_name}さんへの申請をキャンセルしました')
+    messages.info(request, f'{friend_request.to_user.username}さんへの申請をキャンセルしました')
     return redirect(request.META.get('HTTP_REFERER', 'friend:user_search'))
 
 
 @login_required
+@require_POST
 def remove_friend(request, friend_id):
     """
     フレンドを削除
     """
-    friend = get_object_or_404(
-        Friend,
-        Q(id=friend_id) & (Q(user1=request.user) | Q(user2=request.user))
-    )
-
-    # フレンドの名前を取得
-    if friend.user1 == request.user:
-        friend_name = friend.user2.username
-    else:
-        friend_name = friend.user1.username
-
-    # フレンド関係を削除
-    friend.delete()
+    friend = services.remove_friend(request.user, friend_id)
+    if friend is None:
+        raise Http404
 
-    messages.success(request, f'{friend_name}さんをフレンドから削除しました')
-    return redirect(request.META.get('HTTP_REFERER', 'friend:friends'))
+    messages.success(request, f'{friend.username}さんをフレンドから削除しました')
+    return redirect(request.META.get('HTTP_REFERER', 'friend:friends_list'))
 
 
 @login_required
@@ -117,7 +103,10 @@ def friend_requests(request):
     """
     受け取ったフレンド申請一覧
     """
-    received_requests = FriendRequest.objects.filter(to_user=request.user).select_related('from_user')
+    received_requests = []
+    # 件数のキャッシュが0なら一覧のクエリを省く
+    if cached_request_counts(request.user)['received']:
+        received_requests = services.received_requests(request.user)
 
     context = {'received_requests': received_requests,}
     return render(request, 'friend/friend_requests.html', context)
@@ -127,7 +116,10 @@ def sent_requests(request):
     """
     送ったフレンド申請一覧
     """
-    sent_requests = FriendRequest.objects.filter(from_user=request.user).select_related('to_user')
+    sent_requests = []
+    # 件数のキャッシュが0なら一覧のクエリを省く
+    if cached_request_counts(request.user)['sent']:
+        sent_requests = services.sent_requests(request.user)
 
     context = {'sent_requests': sent_requests,}
     return render(request, 'friend/sent_requests.html', context)
@@ -137,62 +129,52 @@ def friends_list(request):
     """
     フレンド一覧
     """
-    # 自分がuser1またはuser2のフレンド関係を取得
-    friendships = Friend.objects.filter(
-        Q(user1=request.user) | Q(user2=request.user)
-    ).select_related('user1', 'user2')
-
-    # フレンドのユーザーオブジェクトを抽出
-    friends = []
-    for friendship in friendships:
-        if friendship.user1 == request.user:
-            friends.append({
-                'user': friendship.user2,
-                'friend_id': friendship.id,
-                'created_at': friendship.created_at
-            })
-        else:
-            friends.append({
-                'user': friendship.user1,
-                'friend_id': friendship.id,
-                'created_at': friendship.created_at
-            })
+    # フレンドが変わるまではキャッシュから読む（FriendLinkの (user, friend) インデックスで1回）
+    friends = cached_friends(request.user)
+    # 運動の累計は記録のたびに変わるのでキャッシュせず、主キーで1回だけ読む（集計はしない）
+    stats = UserActivityStats.objects.in_bulk([friend['user']['id'] for friend in friends])
+    friends = [{**friend, 'stats': stats.get(friend['user']['id'])} for friend in friends]
 
     context = {'friends': friends,}
     return render(request, 'friend/friends_list.html', context)
 
+@login_required
+def friend_suggestions(request):
+    """
+    知り合いかも（共通フレンドが多い順）
+    事前計算済みの候補を申請状態と合わせて1回のクエリで取得
+    """
+    users = suggestions_for(request.user)
+
+    context = {'users': users,}
+    return render(request, 'friend/suggestions.html', context)
+
+@staff_member_required
+def cache_stats(request):
+    """
+    フレンド関連キャッシュのヒット・ミス数（このプロセス分）
+    """
+    return JsonResponse(friend_cache.stats())
+
 @login_required
 def user_search(request):
     query = request.GET.get("q", "")
-    users = []
+    mode = PREFIX if request.GET.get("mode") == PREFIX else CONTAINS
+
+    # フレンド・申請状態をサブクエリで付与して1回のクエリで取得
+    users = services.search_candidates(request.user, query, mode)
 
+    page_obj = None
     if query:
-        users = (
-            User.objects
-            .filter(username__icontains=query)
-            .exclude(id=request.user.id)
-        )
+        paginator = Paginator(users, SEARCH_PAGE_SIZE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        users = page_obj.object_list
     else:
-        users = (
-            User.objects
-            .filter(username__icontains=query)
-            .exclude(id=request.user.id)
-        )[:5]  # 先頭5件だけ取得
-
-    for user in users:
-        # すでにフレンドか
-        user.is_friend = Friend.objects.filter(
-            Q(user1=request.user, user2=user) |
-            Q(user1=user, user2=request.user)
-        ).exists()
-
-        # 申請済みか
-        user.friend_request = FriendRequest.objects.filter(
-            from_user=request.user,
-            to_user=user
-        ).first()  # 存在しなければ None を返す
+        users = users[:SEARCH_DEFAULT_LIMIT]  # 先頭5件だけ取得
 
     return render(request, "friend/user_search.html", {
         "query": query,
+        "mode": mode,
         "users": users,
-    })
\ No newline at end of file
+        "page_obj": page_obj,
+    })
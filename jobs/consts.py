@@ -0,0 +1,12 @@
+# ワーカーのスレッド数
+WORKER_THREADS = 4
+# 実行待ちのジョブがない時に待つ秒数
+POLL_SECONDS = 1.0
+# 1つのジョブを試す回数（最初の1回を含む）
+MAX_ATTEMPTS = 5
+# 再試行までの待ち時間（秒、失敗するたびに2倍）
+RETRY_SECONDS = 10
+# 実行中のまま止まったジョブを実行待ちに戻すまでの秒数
+LOCK_TIMEOUT_SECONDS = 60 * 5
+# 完了したジョブを残しておく日数（この間は同じ冪等キーのジョブを登録しない）
+RETENTION_DAYS = 7
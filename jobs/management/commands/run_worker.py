@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.consts import POLL_SECONDS, WORKER_THREADS
+from jobs.queue import registered_kinds
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "登録されたジョブ（フィード・候補の更新など）を実行するワーカー"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=WORKER_THREADS, help="スレッド数")
+        parser.add_argument('--poll', type=float, default=POLL_SECONDS, help="ジョブがない時に待つ秒数")
+        parser.add_argument(
+            '--kind',
+            action='append',
+            dest='kinds',
+            help="実行するジョブの種類（複数指定可、省略時は全て）",
+        )
+        parser.add_argument('--once', action='store_true', help="実行待ちのジョブがなくなったら終了")
+
+    def handle(self, *args, threads, poll, kinds, once, **options):
+        unknown = set(kinds or []) - set(registered_kinds())
+        if unknown:
+            raise CommandError("未登録のジョブです: " + ", ".join(sorted(unknown)))
+
+        worker = Worker(threads=threads, poll_seconds=poll, kinds=kinds)
+        # Ctrl+C・SIGTERM では実行中のジョブを終えてから止まる
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"ワーカーを開始しました（{threads}スレッド）: " + ", ".join(kinds or registered_kinds()))
+        count = worker.run(once=once)
+        self.stdout.write(self.style.SUCCESS(f"{count}件のジョブを実行しました"))
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from config.middleware import uncounted
+from .consts import MAX_ATTEMPTS
+from .models import Job
+
+
+class Handler(NamedTuple):
+    func: Callable
+    batch_size: int
+    max_attempts: int
+
+
+_handlers = {}
+
+
+def handler(kind, batch_size=1, max_attempts=MAX_ATTEMPTS):
+    """
+    ジョブの処理を登録するデコレーター
+    処理は payload のリストを受け取る（同じ種類のジョブを最大 batch_size 件まとめて渡す）
+    再試行されることがあるので、処理は何度実行しても同じ結果になるように書く
+    """
+    def decorator(func):
+        _handlers[kind] = Handler(func, batch_size, max_attempts)
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    return _handlers.get(kind)
+
+
+def registered_kinds():
+    return list(_handlers)
+
+
+def _run_eagerly(job_ids):
+    """
+    JOBS_EAGER = True の場合はワーカーを待たず、コミット直後にこのスレッドで実行する
+    ジョブのSQLはリクエストのSQL発行数（QUERY_BUDGETS）には数えない
+    """
+    if not getattr(settings, 'JOBS_EAGER', False) or not job_ids:
+        return
+    from .worker import run_jobs  # worker は queue を読み込むため、ここで読み込む
+
+    def run():
+        with uncounted():
+            run_jobs(job_ids)
+    transaction.on_commit(run)
+
+
+def enqueue(kind, payload=None, key=None, delay=None):
+    """
+    ジョブを登録する
+    呼び出し元のトランザクション内で登録されるので、書き込みがコミットされた時だけ実行される
+    key を指定した場合、同じキーのジョブが既にあれば登録せず None を返す
+    """
+    job = Job(kind=kind, payload=payload or {}, idempotency_key=key)
+    if delay:
+        job.run_at = timezone.now() + timedelta(seconds=delay)
+    if key is None:
+        job.save()
+    else:
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return None
+    if not delay:
+        _run_eagerly([job.pk])
+    return job
+
+
+def enqueue_many(kind, payloads):
+    """
+    同じ種類のジョブをまとめて登録する（冪等キーなし）
+    """
+    jobs = Job.objects.bulk_create([Job(kind=kind, payload=payload) for payload in payloads])
+    _run_eagerly([job.pk for job in jobs])
+    return jobs
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from exerciseRecord.models import ExerciseRecord
+from feed.models import TimelineEntry
+from friend.models import Friend
+
+from .models import Job
+from .queue import enqueue, enqueue_many, handler
+from .worker import claim, requeue_stale, run_pending
+
+calls = []
+
+
+@handler('test.batch', batch_size=3)
+def batch_job(payloads):
+    calls.append([payload['n'] for payload in payloads])
+
+
+@handler('test.flaky', max_attempts=2)
+def flaky_job(payloads):
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_same_kind_jobs_are_batched(self):
+        enqueue_many('test.batch', [{'n': n} for n in range(5)])
+
+        self.assertEqual(run_pending(['test.batch']), 5)
+        self.assertEqual(calls, [[0, 1, 2], [3, 4]])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 5)
+
+    def test_idempotency_key(self):
+        self.assertIsNotNone(enqueue('test.batch', {'n': 1}, key='once'))
+        self.assertIsNone(enqueue('test.batch', {'n': 1}, key='once'))
+
+        run_pending(['test.batch'])
+        # 完了後も保持期間中は同じキーで登録されない
+        self.assertIsNone(enqueue('test.batch', {'n': 1}, key='once'))
+        self.assertEqual(calls, [[1]])
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        job = enqueue('test.flaky')
+        with self.assertLogs('jobs', 'ERROR'):
+            run_pending(['test.flaky'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+
+        # 待ち時間を過ぎたことにして再実行
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        with self.assertLogs('jobs', 'ERROR'):
+            run_pending(['test.flaky'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        enqueue('test.batch', {'n': 1})
+        self.assertEqual(len(claim('test.batch', 10)), 1)
+        self.assertEqual(claim('test.batch', 10), [])
+
+    def test_job_that_kills_the_worker_is_failed_after_max_attempts(self):
+        job = enqueue('test.flaky')
+        for attempt in (1, 2):
+            Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+            self.assertEqual(len(claim('test.flaky', 10)), 1)
+            # ワーカーが落ちてロックの期限が切れた状態
+            Job.objects.filter(pk=job.pk).update(updated_at=job.created_at - timedelta(hours=1))
+            self.assertEqual(requeue_stale(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(claim('test.flaky', 10), [])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_jobs_run_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_many('test.batch', [{'n': n} for n in range(4)])
+            enqueue('test.batch', {'n': 9}, delay=60)
+            self.assertEqual(calls, [])
+
+        self.assertEqual(calls, [[0, 1, 2], [3]])
+        # 遅らせたジョブはワーカーに任せる
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+
+@override_settings(JOBS_EAGER=True, QUERY_BUDGET_RAISE=True)
+class EagerJobBudgetTests(TransactionTestCase):
+    def test_eager_jobs_do_not_count_against_the_view_budget(self):
+        user = User.objects.create(username='runner')
+        for n in range(3):
+            Friend.objects.create(user1=user, user2=User.objects.create(username=f'friend{n}'))
+        self.client.force_login(user)
+
+        self.client.post(reverse('exercising'), {'action': 'start'})
+        # コミット時にリクエストの中でタイムラインへの書き込みが実行される
+        response = self.client.post(reverse('exercising'), {'action': 'end'})
+
+        record = ExerciseRecord.objects.get(user=user)
+        self.assertRedirects(response, reverse('post_exercise', args=[record.pk]))
+        self.assertEqual(TimelineEntry.objects.filter(record=record).count(), 3)
@@ -0,0 +1,216 @@
+import logging
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .consts import LOCK_TIMEOUT_SECONDS, POLL_SECONDS, RETENTION_DAYS, RETRY_SECONDS, WORKER_THREADS
+from .models import Job
+from .queue import get_handler, registered_kinds
+
+logger = logging.getLogger('jobs')
+
+
+def claim(kind, limit):
+    """
+    実行待ちのジョブを最大 limit 件取り出して実行中にする
+    SQLiteには SELECT ... FOR UPDATE がないため、status を条件にしたUPDATEで取り合う
+    （別のワーカーが先に取ったジョブは更新されない）
+    """
+    now = timezone.now()
+    ids = list(
+        Job.objects
+        .filter(status=Job.PENDING, kind=kind, run_at__lte=now)
+        .order_by('run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    return _lock(ids, now)
+
+
+def _lock(ids, now):
+    token = uuid.uuid4().hex
+    Job.objects.filter(id__in=ids, status=Job.PENDING).update(
+        status=Job.RUNNING,
+        lock_token=token,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    return list(Job.objects.filter(lock_token=token, status=Job.RUNNING).order_by('id'))
+
+
+def _fail(jobs, handler, error):
+    now = timezone.now()
+    for job in jobs:
+        if handler is not None and job.attempts < handler.max_attempts:
+            # 失敗するたびに待ち時間を2倍にして再試行
+            job.status = Job.PENDING
+            job.run_at = now + timedelta(seconds=RETRY_SECONDS * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+        job.last_error = error
+        job.lock_token = ''
+        job.save(update_fields=['status', 'run_at', 'last_error', 'lock_token', 'updated_at'])
+
+
+def run_batch(jobs):
+    """
+    同じ種類のジョブをまとめて実行する
+    処理の書き込みと完了の記録を同じトランザクションで行うため、
+    途中で失敗した場合は何も反映されずに再試行される
+    """
+    if not jobs:
+        return
+    handler = get_handler(jobs[0].kind)
+    if handler is None:
+        _fail(jobs, None, f"未登録のジョブです: {jobs[0].kind}")
+        return
+
+    try:
+        with transaction.atomic():
+            handler.func([job.payload for job in jobs])
+            Job.objects.filter(id__in=[job.pk for job in jobs]).update(
+                status=Job.DONE,
+                lock_token='',
+                last_error='',
+                updated_at=timezone.now(),
+            )
+    except Exception:
+        logger.exception("ジョブの実行に失敗しました: %s (%d件)", jobs[0].kind, len(jobs))
+        _fail(jobs, handler, traceback.format_exc())
+
+
+def pending_kinds(kinds=None):
+    kinds = kinds or registered_kinds()
+    return list(
+        Job.objects
+        .filter(status=Job.PENDING, kind__in=kinds, run_at__lte=timezone.now())
+        .values_list('kind', flat=True)
+        .distinct()
+    )
+
+
+def requeue_stale():
+    """
+    ワーカーが落ちて実行中のまま止まったジョブを実行待ちに戻す
+    取り出した時点で試行回数に数えているので、上限に達したジョブは失敗にする
+    （ワーカーごと落とすジョブが繰り返し実行されないように）
+    戻り値: 対象にしたジョブの件数
+    """
+    threshold = timezone.now() - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    stale = list(Job.objects.filter(status=Job.RUNNING, updated_at__lt=threshold).order_by('id'))
+    by_kind = {}
+    for job in stale:
+        by_kind.setdefault(job.kind, []).append(job)
+    for kind, jobs in by_kind.items():
+        _fail(jobs, get_handler(kind), "実行中にワーカーが停止しました")
+    return len(stale)
+
+
+def purge_done():
+    """
+    保持期間を過ぎた完了ジョブを削除
+    """
+    threshold = timezone.now() - timedelta(days=RETENTION_DAYS)
+    return Job.objects.filter(status=Job.DONE, updated_at__lt=threshold).delete()[0]
+
+
+def run_pending(kinds=None):
+    """
+    実行待ちのジョブをこのスレッドで全て実行する（テスト・デバッグ用）
+    戻り値: 実行したジョブの件数
+    """
+    count = 0
+    while True:
+        batches = [
+            claim(kind, get_handler(kind).batch_size)
+            for kind in pending_kinds(kinds)
+        ]
+        batches = [jobs for jobs in batches if jobs]
+        if not batches:
+            return count
+        for jobs in batches:
+            run_batch(jobs)
+            count += len(jobs)
+
+
+def run_jobs(job_ids):
+    """
+    指定したジョブをこのスレッドで実行する（JOBS_EAGER の場合にコミット直後に呼ばれる）
+    ワーカーが先に取ったジョブは飛ばす。失敗したジョブは通常どおり再試行待ちになる
+    戻り値: 実行したジョブの件数
+    """
+    jobs = _lock(job_ids, timezone.now())
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+    for kind, kind_jobs in by_kind.items():
+        handler = get_handler(kind)
+        size = handler.batch_size if handler else len(kind_jobs)
+        for start in range(0, len(kind_jobs), size):
+            run_batch(kind_jobs[start:start + size])
+    return len(jobs)
+
+
+class Worker:
+    """
+    実行待ちのジョブを取り出してスレッドプールで実行する
+    取り出しはメインスレッドで行い、種類ごとに batch_size 件ずつまとめて渡す
+    """
+    def __init__(self, threads=WORKER_THREADS, poll_seconds=POLL_SECONDS, kinds=None):
+        self.threads = threads
+        self.poll_seconds = poll_seconds
+        self.kinds = kinds
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def claim_batches(self):
+        batches = []
+        for kind in pending_kinds(self.kinds):
+            handler = get_handler(kind)
+            while len(batches) < self.threads:
+                jobs = claim(kind, handler.batch_size)
+                if not jobs:
+                    break
+                batches.append(jobs)
+        return batches
+
+    def _run(self, jobs):
+        close_old_connections()
+        try:
+            run_batch(jobs)
+        except Exception:
+            # 失敗の記録もできなかった場合は LOCK_TIMEOUT_SECONDS 後に実行待ちに戻る
+            logger.exception("ジョブの状態を更新できませんでした: %s", [job.pk for job in jobs])
+        finally:
+            close_old_connections()
+
+    def run(self, once=False):
+        """
+        once=True の場合は実行待ちのジョブがなくなったら終了する
+        戻り値: 実行したジョブの件数
+        """
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as executor:
+            while not self.stopping.is_set():
+                requeue_stale()
+                batches = self.claim_batches()
+                if batches:
+                    wait([executor.submit(self._run, jobs) for jobs in batches])
+                    count += sum(len(jobs) for jobs in batches)
+                    continue
+                if once:
+                    break
+                purge_done()
+                self.stopping.wait(self.poll_seconds)
+        return count
@@ -0,0 +1,9 @@
+# 統計APIで返す日数・週数の上限
+MAX_STATS_DAYS = 366
+MAX_STATS_WEEKS = 104
+# ランキングのキャッシュ保持時間（秒）
+LEADERBOARD_TTL = 60 * 60
+# 活動カレンダーの日数（今日を含む）
+HEATMAP_DAYS = 365
+# 活動カレンダーの濃さの区切り（1日の運動時間・分）
+HEATMAP_LEVELS = (1, 15, 30, 60)
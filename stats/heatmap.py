@@ -0,0 +1,118 @@
+from array import array
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from config import fragments
+from exerciseRecord.models import ExerciseRecord
+from .consts import HEATMAP_DAYS, HEATMAP_LEVELS
+
+# 1日あたりの運動時間（分）を入れる型（符号なし16ビット、上限 65535）
+TYPECODE = 'H'
+MAX_MINUTES = 2 ** 16 - 1
+# 日付が変わるまでに再計算されるので、保持時間は1日あれば足りる
+HEATMAP_TTL = 60 * 60 * 24
+
+
+def user_today(user):
+    """
+    ユーザーのタイムゾーンでの今日
+    """
+    return datetime.now(user.tzinfo()).date()
+
+
+def heatmap_rows(user, start):
+    """
+    start 以降の日ごとの合計運動時間 (日付, 分)
+    """
+    tz = user.tzinfo()
+    since = datetime.combine(start, datetime.min.time(), tzinfo=tz)
+    return (
+        ExerciseRecord.objects
+        .filter(user=user, exercise_start_time__gte=since)
+        .annotate(day=TruncDate('exercise_start_time', tzinfo=tz))
+        .values('day')
+        .annotate(minutes=Sum('duration_minutes'))
+        .order_by()
+        .values_list('day', 'minutes')
+    )
+
+
+def compute_heatmap(user, today):
+    """
+    today までの HEATMAP_DAYS 日分の運動時間（分）を日ごとに集計
+    ユーザーのタイムゾーンで日付に切り捨てて、1回の GROUP BY で数える
+    戻り値: 古い日から順の array('H')
+    """
+    start = today - timedelta(days=HEATMAP_DAYS - 1)
+    minutes = array(TYPECODE, [0]) * HEATMAP_DAYS
+    for day, total in heatmap_rows(user, start):
+        index = (day - start).days
+        if 0 <= index < HEATMAP_DAYS:
+            minutes[index] = max(0, min(total, MAX_MINUTES))
+    return minutes
+
+
+def get_heatmap(user):
+    """
+    活動カレンダー（キャッシュ）
+    運動記録が書き込まれると版が進み、日付やタイムゾーンが変わるとキーが変わる
+    戻り値: (最初の日, array('H'))
+    """
+    today = user_today(user)
+    version = fragments.versions(user.pk, [fragments.RECORDS])[fragments.RECORDS]
+    key = f"stats:heatmap:{user.pk}:{version}:{today.isoformat()}:{user.time_zone}"
+
+    data = cache.get(key)
+    if data is None:
+        minutes = compute_heatmap(user, today)
+        cache.set(key, minutes.tobytes(), HEATMAP_TTL)
+    else:
+        minutes = array(TYPECODE)
+        minutes.frombytes(data)
+    return today - timedelta(days=HEATMAP_DAYS - 1), minutes
+
+
+def streaks(minutes):
+    """
+    連続して運動した日数
+    current: 今日（今日がまだなら昨日）までの連続日数
+    longest: 期間中の最長の連続日数
+    """
+    longest = run = 0
+    for value in minutes:
+        run = run + 1 if value else 0
+        longest = max(longest, run)
+
+    current = 0
+    days = list(minutes)
+    if days and not days[-1]:
+        days.pop()
+    for value in reversed(days):
+        if not value:
+            break
+        current += 1
+    return {'current': current, 'longest': longest}
+
+
+def level(value):
+    """
+    表示用の濃さ（0〜4）
+    """
+    return sum(1 for threshold in HEATMAP_LEVELS if value >= threshold)
+
+
+def calendar_weeks(start, minutes):
+    """
+    テンプレート用に週（月曜始まり）ごとの列にする
+    戻り値: 曜日ごとの行 [[{'day', 'minutes', 'level'} or None, ...], ...]（7行）
+    """
+    cells = [None] * start.weekday()
+    cells += [
+        {'day': start + timedelta(days=i), 'minutes': value, 'level': level(value)}
+        for i, value in enumerate(minutes)
+    ]
+    cells += [None] * (-len(cells) % 7)
+    return [cells[weekday::7] for weekday in range(7)]
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import User
+from config import cache_versions
+from friend.models import FriendLink
+from friend.cache import cached_friend_ids
+from .consts import LEADERBOARD_TTL
+from .models import DailyRollup, WeeklyRollup
+from .services import week_start
+
+WEEK = "week"
+MONTH = "month"
+PERIODS = (WEEK, MONTH)
+
+
+def period_start(period, today=None):
+    """
+    集計期間の開始日（週は月曜日、月は1日）
+    """
+    today = today or timezone.localdate()
+    if period == MONTH:
+        return today.replace(day=1)
+    return week_start(today)
+
+
+def _version_key(user_id):
+    return f"leaderboard:v:{user_id}"
+
+
+def _versions(user_ids):
+    """
+    ユーザーごとのランキングの版（1回の get_many でまとめて読む）
+    """
+    keys = {_version_key(user_id): user_id for user_id in user_ids}
+    return {keys[key]: version for key, version in cache_versions.get_versions(keys).items()}
+
+
+def _cache_key(period, user_id, start, version):
+    return f"leaderboard:{period}:{start.isoformat()}:{user_id}:{version}"
+
+
+def period_rows(period, start, user_ids=None):
+    """
+    期間内のユーザーごとの合計運動時間（queryset）
+    """
+    if period == MONTH:
+        rows = DailyRollup.objects.filter(day__gte=start, day__lt=_next_month(start))
+    else:
+        rows = WeeklyRollup.objects.filter(week_start=start)
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    return rows.values('user_id').annotate(minutes=Sum('total_minutes')).values_list('user_id', 'minutes')
+
+
+def _period_totals(period, start, user_ids=None):
+    """
+    期間内の合計運動時間を {user_id: 分} で取得
+    """
+    return dict(period_rows(period, start, user_ids))
+
+
+def _next_month(start):
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _rank(user_ids, usernames, totals):
+    """
+    合計時間の多い順に順位を付ける（同点は同順位）
+    """
+    entries = sorted(
+        (
+            {
+                'user_id': user_id,
+                'username': usernames[user_id],
+                'total_minutes': totals.get(user_id, 0),
+            }
+            for user_id in user_ids if user_id in usernames
+        ),
+        key=lambda entry: (-entry['total_minutes'], entry['username']),
+    )
+    previous = None
+    for position, entry in enumerate(entries, start=1):
+        if entry['total_minutes'] != previous:
+            rank = position
+            previous = entry['total_minutes']
+        entry['rank'] = rank
+    return entries
+
+
+def compute_leaderboard(user, period, start=None):
+    """
+    user とそのフレンドのランキングを計算
+    """
+    start = start or period_start(period)
+    user_ids = [user.pk] + cached_friend_ids(user)
+    usernames = dict(User.objects.filter(pk__in=user_ids).values_list('pk', 'username'))
+    return _rank(user_ids, usernames, _period_totals(period, start, user_ids))
+
+
+def get_leaderboard(user, period):
+    """
+    キャッシュ済みのランキングを取得（なければ計算して保存）
+    """
+    start = period_start(period)
+    # 計算前に版を読むので、計算中に更新されても古い値は古い版のキーに入るだけ
+    key = _cache_key(period, user.pk, start, _versions([user.pk])[user.pk])
+    entries = cache.get(key)
+    if entries is None:
+        entries = compute_leaderboard(user, period, start)
+        cache.set(key, entries, LEADERBOARD_TTL)
+    return entries
+
+
+def invalidate(user_ids):
+    """
+    指定ユーザーのランキングの版を進めて、古いキャッシュを読まれないようにする
+    """
+    cache_versions.bump(_version_key(user_id) for user_id in user_ids)
+
+
+def refresh_all(period, batch_size=1000):
+    """
+    全ユーザーのランキングをまとめて計算してキャッシュに載せる
+    集計とフレンド関係はそれぞれ1回のクエリで読む
+    """
+    start = period_start(period)
+    totals = _period_totals(period, start)
+    usernames = dict(User.objects.values_list('pk', 'username'))
+
+    friends = defaultdict(list)
+    for user_id, friend_id in FriendLink.objects.values_list('user_id', 'friend_id').iterator():
+        friends[user_id].append(friend_id)
+
+    user_ids = list(usernames)
+    for i in range(0, len(user_ids), batch_size):
+        chunk = user_ids[i:i + batch_size]
+        versions = _versions(chunk)
+        cache.set_many({
+            _cache_key(period, user_id, start, versions[user_id]):
+                _rank([user_id] + friends[user_id], usernames, totals)
+            for user_id in chunk
+        }, LEADERBOARD_TTL)
+    return len(usernames)
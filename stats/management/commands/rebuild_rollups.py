@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from stats.services import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "運動記録から日次・週次集計を作り直す"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="対象ユーザー名（複数指定可、省略時は全ユーザー）",
+        )
+
+    def handle(self, *args, usernames, **options):
+        user_ids = None
+        if usernames:
+            user_ids = list(User.objects.filter(username__in=usernames).values_list('pk', flat=True))
+
+        days, weeks = rebuild_rollups(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"日次集計{days}件・週次集計{weeks}件を作り直しました"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from stats.services import reconcile_activity_stats
+
+
+class Command(BaseCommand):
+    help = "ユーザーの運動の累計を運動記録と突き合わせ、ずれを検出する（--fix で修復）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="ずれていた累計を運動記録の集計で上書きする")
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help="対象ユーザー名（複数指定可、省略時は全ユーザー）",
+        )
+
+    def handle(self, *args, fix, usernames, **options):
+        user_ids = None
+        if usernames:
+            user_ids = list(User.objects.filter(username__in=usernames).values_list('pk', flat=True))
+
+        drift = reconcile_activity_stats(user_ids, fix=fix)
+        for row in drift:
+            self.stdout.write(f"user={row['user_id']} 記録の集計={row['expected']} 累計={row['actual']}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("ずれはありませんでした"))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f"{len(drift)}人の累計を修復しました"))
+        else:
+            raise CommandError(f"{len(drift)}人の累計がずれています（--fix で修復できます）")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from stats.leaderboard import PERIODS, refresh_all
+
+
+class Command(BaseCommand):
+    help = "全ユーザーのフレンドランキングを計算してキャッシュに載せる（cron等から定期実行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=PERIODS,
+            action='append',
+            dest='periods',
+            help="対象期間（省略時は週・月の両方）",
+        )
+
+    def handle(self, *args, periods, **options):
+        for period in periods or PERIODS:
+            count = refresh_all(period)
+            self.stdout.write(self.style.SUCCESS(f"{period}: {count}人のランキングを更新しました"))
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_activity_stats(apps, schema_editor):
+    """
+    既存の運動記録から累計を作成
+    """
+    ExerciseRecord = apps.get_model('exerciseRecord', 'ExerciseRecord')
+    UserActivityStats = apps.get_model('stats', 'UserActivityStats')
+    rows = (
+        ExerciseRecord.objects
+        .values('user_id')
+        .annotate(
+            session_count=Count('id'),
+            total_minutes=Sum('duration_minutes'),
+            last_exercise_at=Max('exercise_start_time'),
+        )
+        .order_by()
+    )
+    UserActivityStats.objects.bulk_create([UserActivityStats(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_search_index'),
+        ('exerciseRecord', '0004_diary_search_index'),
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('session_count', models.IntegerField(default=0)),
+                ('total_minutes', models.IntegerField(default=0)),
+                ('last_exercise_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_activity_stats, migrations.RunPython.noop),
+    ]
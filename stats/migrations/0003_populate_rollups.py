@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def populate_rollups(apps, schema_editor):
+    """
+    既存の運動記録から日次・週次集計を作成
+    （集計がないまま差分を反映すると、既存の記録の削除で負の値になるため）
+    """
+    from stats.services import aggregate_rollups
+
+    ExerciseRecord = apps.get_model('exerciseRecord', 'ExerciseRecord')
+    DailyRollup = apps.get_model('stats', 'DailyRollup')
+    WeeklyRollup = apps.get_model('stats', 'WeeklyRollup')
+
+    daily_rollups, weekly_rollups = aggregate_rollups(ExerciseRecord.objects.all(), DailyRollup, WeeklyRollup)
+    # 0001 の適用後に記録が作られていた場合は差分で作られた行を作り直す
+    DailyRollup.objects.all().delete()
+    WeeklyRollup.objects.all().delete()
+    DailyRollup.objects.bulk_create(daily_rollups, batch_size=500)
+    WeeklyRollup.objects.bulk_create(weekly_rollups, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exerciseRecord', '0004_diary_search_index'),
+        ('stats', '0002_useractivitystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+from django.db import models
+from accounts.models import User
+
+
+class DailyRollup(models.Model):
+    """
+    ユーザーごと・日ごとの運動集計
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='daily_rollups',
+        on_delete=models.CASCADE
+    )
+    day = models.DateField()
+    session_count = models.IntegerField(default=0)
+    total_minutes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='daily_rollup_user_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}: {self.total_minutes}分"
+
+
+class WeeklyRollup(models.Model):
+    """
+    ユーザーごと・ISO週ごとの運動集計
+    week_start はその週の月曜日
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='weekly_rollups',
+        on_delete=models.CASCADE
+    )
+    week_start = models.DateField()
+    session_count = models.IntegerField(default=0)
+    total_minutes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'week_start'], name='weekly_rollup_user_week_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.week_start}週: {self.total_minutes}分"
+
+
+class UserActivityStats(models.Model):
+    """
+    ユーザーごとの運動の累計（運動記録の作成・編集・削除時に F() で更新する）
+    ずれた場合は reconcile_activity_stats で検出・修復する
+    """
+    user = models.OneToOneField(
+        User,
+        related_name='activity_stats',
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    session_count = models.IntegerField(default=0)
+    total_minutes = models.IntegerField(default=0)
+    # 最後に運動を始めた時刻（運動記録がなければ None）
+    last_exercise_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.session_count}回 {self.total_minutes}分"
@@ -0,0 +1,258 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from exerciseRecord.models import ExerciseRecord
+from .models import DailyRollup, UserActivityStats, WeeklyRollup
+
+# 運動記録がないユーザーの累計（回数, 分, 最後の運動）
+EMPTY_ACTIVITY = (0, 0, None)
+
+
+def record_day(start_time):
+    """
+    運動記録が属する日（ローカル日付）
+    """
+    return timezone.localdate(start_time)
+
+
+def week_start(day):
+    """
+    ISO週の月曜日
+    """
+    return day - timedelta(days=day.weekday())
+
+
+def daily_rows(user, days, today):
+    """
+    直近 days 日の日次集計（古い順）
+    """
+    return (
+        DailyRollup.objects
+        .filter(user=user, day__gt=today - timedelta(days=days))
+        .order_by('day')
+        .values('day', 'session_count', 'total_minutes')
+    )
+
+
+def weekly_rows(user, weeks, today):
+    """
+    直近 weeks 週の週次集計（古い順）
+    """
+    return (
+        WeeklyRollup.objects
+        .filter(user=user, week_start__gt=week_start(today) - timedelta(weeks=weeks))
+        .order_by('week_start')
+        .values('week_start', 'session_count', 'total_minutes')
+    )
+
+
+def _add(model, user_id, key, sessions, minutes, update=None, create=None):
+    """
+    model の (user, key) の行に回数と時間を加算する（行がなければ作る）
+    update: 加算と同じUPDATEで更新する列
+    create: 行を作る時に設定する列を返す関数
+    """
+    rows = model.objects.filter(user_id=user_id, **key)
+    changes = {
+        'session_count': F('session_count') + sessions,
+        'total_minutes': F('total_minutes') + minutes,
+        **(update or {}),
+    }
+    if rows.update(**changes) or sessions <= 0:
+        # 減算で行がない場合は作らない（ユーザー削除時のCASCADEなど）
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                user_id=user_id,
+                session_count=sessions,
+                total_minutes=minutes,
+                **key,
+                **(create() if create else {})
+            )
+    except IntegrityError:
+        # 同時に作成された場合は加算し直す
+        rows.update(**changes)
+
+
+def _last_exercise_at():
+    # (user, exercise_start_time) のユニークインデックスを逆順に1件読むだけ
+    return Subquery(
+        ExerciseRecord.objects
+        .filter(user_id=OuterRef('user_id'))
+        .order_by('-exercise_start_time')
+        .values('exercise_start_time')[:1]
+    )
+
+
+def add_activity(user_id, sessions, minutes):
+    """
+    ユーザーの累計に加算する（F() と最後の運動時刻の取り直しを1回のUPDATEで行う）
+    """
+    _add(
+        UserActivityStats, user_id, {}, sessions, minutes,
+        update={'last_exercise_at': _last_exercise_at(), 'updated_at': timezone.now()},
+        create=lambda: {
+            'last_exercise_at': ExerciseRecord.objects.filter(user_id=user_id)
+            .aggregate(last=Max('exercise_start_time'))['last'],
+        },
+    )
+
+
+def apply_delta(user_id, start_time, sessions, minutes):
+    """
+    運動記録1件分の増減を日次・週次集計とユーザーの累計に反映
+    """
+    day = record_day(start_time)
+    _add(DailyRollup, user_id, {'day': day}, sessions, minutes)
+    _add(WeeklyRollup, user_id, {'week_start': week_start(day)}, sessions, minutes)
+    add_activity(user_id, sessions, minutes)
+
+
+def apply_records(records):
+    """
+    まとめて作成した運動記録を日次・週次集計とユーザーの累計に反映
+    同じユーザー・同じ日の記録は1回の更新にまとめる
+    """
+    daily = defaultdict(lambda: [0, 0])
+    weekly = defaultdict(lambda: [0, 0])
+    activity = defaultdict(lambda: [0, 0])
+    for record in records:
+        day = record_day(record.exercise_start_time)
+        for totals in (
+            daily[(record.user_id, day)],
+            weekly[(record.user_id, week_start(day))],
+            activity[record.user_id],
+        ):
+            totals[0] += 1
+            totals[1] += record.duration_minutes
+
+    for (user_id, day), (sessions, minutes) in daily.items():
+        _add(DailyRollup, user_id, {'day': day}, sessions, minutes)
+    for (user_id, start), (sessions, minutes) in weekly.items():
+        _add(WeeklyRollup, user_id, {'week_start': start}, sessions, minutes)
+    for user_id, (sessions, minutes) in activity.items():
+        add_activity(user_id, sessions, minutes)
+
+
+def aggregate_rollups(records, daily_model=DailyRollup, weekly_model=WeeklyRollup):
+    """
+    運動記録の queryset から日次・週次集計の行を作る（保存はしない）
+    マイグレーションからも履歴モデルを渡して使う
+    戻り値: (日次集計のリスト, 週次集計のリスト)
+    """
+    rows = (
+        records
+        .annotate(day=TruncDate('exercise_start_time'))
+        .values('user_id', 'day')
+        .annotate(session_count=Count('id'), total_minutes=Sum('duration_minutes'))
+        .order_by()
+    )
+
+    daily_rollups = []
+    weeks = defaultdict(lambda: [0, 0])
+    for row in rows.iterator():
+        daily_rollups.append(daily_model(
+            user_id=row['user_id'],
+            day=row['day'],
+            session_count=row['session_count'],
+            total_minutes=row['total_minutes'],
+        ))
+        totals = weeks[(row['user_id'], week_start(row['day']))]
+        totals[0] += row['session_count']
+        totals[1] += row['total_minutes']
+
+    weekly_rollups = [
+        weekly_model(
+            user_id=user_id,
+            week_start=start,
+            session_count=session_count,
+            total_minutes=total_minutes,
+        )
+        for (user_id, start), (session_count, total_minutes) in weeks.items()
+    ]
+    return daily_rollups, weekly_rollups
+
+
+def rebuild_rollups(user_ids=None):
+    """
+    運動記録から日次・週次集計を作り直す
+    """
+    records = ExerciseRecord.objects.all()
+    daily = DailyRollup.objects.all()
+    weekly = WeeklyRollup.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        daily = daily.filter(user_id__in=user_ids)
+        weekly = weekly.filter(user_id__in=user_ids)
+
+    daily_rollups, weekly_rollups = aggregate_rollups(records)
+    with transaction.atomic():
+        daily.delete()
+        weekly.delete()
+        DailyRollup.objects.bulk_create(daily_rollups, batch_size=500)
+        WeeklyRollup.objects.bulk_create(weekly_rollups, batch_size=500)
+    return len(daily_rollups), len(weekly_rollups)
+
+
+def reconcile_activity_stats(user_ids=None, fix=False):
+    """
+    ユーザーの累計を運動記録の集計と比べ、ずれているユーザーを返す
+    fix=True の場合は集計の値で上書きする（運動記録がないユーザーは0にする）
+
+    戻り値: [{'user_id': ID, 'expected': (回数, 分, 最後の運動), 'actual': 同じ形 or None}, ...]
+    """
+    records = ExerciseRecord.objects.all()
+    stats = UserActivityStats.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+
+    expected = {
+        row['user_id']: (row['session_count'], row['total_minutes'], row['last_exercise_at'])
+        for row in (
+            records
+            .values('user_id')
+            .annotate(
+                session_count=Count('id'),
+                total_minutes=Sum('duration_minutes'),
+                last_exercise_at=Max('exercise_start_time'),
+            )
+            .order_by()
+            .iterator()
+        )
+    }
+    actual = {
+        user_id: (session_count, total_minutes, last_exercise_at)
+        for user_id, session_count, total_minutes, last_exercise_at in stats.values_list(
+            'user_id', 'session_count', 'total_minutes', 'last_exercise_at'
+        ).iterator()
+    }
+
+    drift = [
+        {'user_id': user_id, 'expected': expected.get(user_id, EMPTY_ACTIVITY), 'actual': actual.get(user_id)}
+        for user_id in sorted(expected.keys() | actual.keys())
+        if expected.get(user_id, EMPTY_ACTIVITY) != actual.get(user_id)
+    ]
+    if fix and drift:
+        UserActivityStats.objects.bulk_create(
+            [
+                UserActivityStats(
+                    user_id=row['user_id'],
+                    session_count=row['expected'][0],
+                    total_minutes=row['expected'][1],
+                    last_exercise_at=row['expected'][2],
+                )
+                for row in drift
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['session_count', 'total_minutes', 'last_exercise_at', 'updated_at'],
+        )
+    return drift
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from exerciseRecord.models import ExerciseRecord
+from exerciseRecord.signals import records_bulk_created
+from friend.models import Friend
+from friend.services import friend_ids
+from . import leaderboard, services
+
+
+def _snapshot(instance):
+    # 遅延読み込みのフィールドを触らないよう __dict__ から読む
+    return (
+        instance.__dict__.get('user_id'),
+        instance.__dict__.get('exercise_start_time'),
+        instance.__dict__.get('duration_minutes'),
+    )
+
+
+@receiver(post_init, sender=ExerciseRecord)
+def remember_rollup_state(sender, instance, **kwargs):
+    """
+    集計に関わる値を読み込み時点で覚えておく（編集時の差分計算用）
+    """
+    instance._rollup_state = _snapshot(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=ExerciseRecord)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    運動記録の作成・編集を日次・週次集計に反映
+    """
+    if raw:
+        return
+    old = None if created else instance._rollup_state
+    new = _snapshot(instance)
+    if old == new:
+        return
+    if old is not None and None not in old:
+        user_id, start_time, minutes = old
+        services.apply_delta(user_id, start_time, -1, -minutes)
+    user_id, start_time, minutes = new
+    services.apply_delta(user_id, start_time, 1, minutes)
+    instance._rollup_state = new
+
+
+@receiver(post_delete, sender=ExerciseRecord)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """
+    運動記録の削除を日次・週次集計に反映
+    """
+    user_id, start_time, minutes = instance._rollup_state or _snapshot(instance)
+    if start_time is None:
+        return
+    services.apply_delta(user_id, start_time, -1, -minutes)
+
+
+@receiver(records_bulk_created, sender=ExerciseRecord)
+def update_rollups_on_bulk_create(sender, records, **kwargs):
+    """
+    まとめて作成された運動記録を日次・週次集計に反映
+    """
+    services.apply_records(records)
+    for record in records:
+        record._rollup_state = _snapshot(record)
+
+
+def _invalidate_leaderboards(user_ids):
+    # コミット前に再計算されて古い値がキャッシュされないようにする
+    transaction.on_commit(lambda: leaderboard.invalidate(user_ids))
+
+
+@receiver(post_save, sender=ExerciseRecord)
+@receiver(post_delete, sender=ExerciseRecord)
+def invalidate_leaderboards_on_record_change(sender, instance, raw=False, **kwargs):
+    """
+    運動記録が変わったら本人とフレンドのランキングを破棄
+    """
+    if raw:
+        return
+    _invalidate_leaderboards([instance.user_id] + friend_ids(instance.user_id))
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def invalidate_leaderboards_on_friend_change(sender, instance, raw=False, **kwargs):
+    """
+    フレンド関係が変わったら2人のランキングを破棄
+    """
+    if raw:
+        return
+    _invalidate_leaderboards([instance.user1_id, instance.user2_id])
+
+
+@receiver(records_bulk_created, sender=ExerciseRecord)
+def invalidate_leaderboards_on_bulk_create(sender, records, **kwargs):
+    """
+    まとめて作成された運動記録の投稿者とそのフレンドのランキングを破棄
+    """
+    user_ids = set()
+    for author_id in {record.user_id for record in records}:
+        user_ids.add(author_id)
+        user_ids.update(friend_ids(author_id))
+    _invalidate_leaderboards(list(user_ids))
@@ -0,0 +1,18 @@
+from django import template
+
+from stats.heatmap import calendar_weeks, get_heatmap, streaks
+
+register = template.Library()
+
+
+@register.inclusion_tag('stats/heatmap.html')
+def activity_heatmap(user):
+    """
+    活動カレンダー（365日分）と連続記録
+    使い方: {% load stats_tags %}{% activity_heatmap user %}
+    """
+    start, minutes = get_heatmap(user)
+    return {
+        'rows': calendar_weeks(start, minutes),
+        'streak': streaks(minutes),
+    }
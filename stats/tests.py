@@ -0,0 +1,271 @@
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from exerciseRecord.importer import import_records
+from exerciseRecord.models import ExerciseRecord
+from friend.models import Friend
+from . import leaderboard
+from .heatmap import HEATMAP_DAYS, compute_heatmap, streaks, user_today
+from .models import DailyRollup, UserActivityStats, WeeklyRollup
+from .services import rebuild_rollups, reconcile_activity_stats
+
+
+def create_record(user, start, minutes=30):
+    """
+    start から minutes 分の運動記録を作る
+    """
+    return ExerciseRecord.objects.create(
+        user=user, duration_minutes=minutes,
+        exercise_start_time=start, exercise_end_time=start + timedelta(minutes=minutes),
+    )
+
+
+class UserActivityStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=3)
+
+    def stats(self):
+        stats = UserActivityStats.objects.get(user=self.user)
+        return stats.session_count, stats.total_minutes, stats.last_exercise_at
+
+    def test_counters_follow_create_edit_delete(self):
+        first = create_record(self.user, self.start, 30)
+        latest = create_record(self.user, self.start + timedelta(days=1), 20)
+        self.assertEqual(self.stats(), (2, 50, latest.exercise_start_time))
+
+        first.duration_minutes = 45
+        first.save()
+        self.assertEqual(self.stats(), (2, 65, latest.exercise_start_time))
+
+        latest.delete()
+        self.assertEqual(self.stats(), (1, 45, first.exercise_start_time))
+
+        end = self.start + timedelta(days=2, minutes=10)
+        import_records([(1, {
+            'exercise_start_time': (self.start + timedelta(days=2)).isoformat(),
+            'exercise_end_time': end.isoformat(),
+        })], user=self.user)
+        self.assertEqual(self.stats(), (2, 55, self.start + timedelta(days=2)))
+        self.assertEqual(reconcile_activity_stats(), [])
+
+    def test_reconcile_detects_and_repairs_drift(self):
+        create_record(self.user, self.start, 30)
+        UserActivityStats.objects.filter(user=self.user).update(total_minutes=999)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_activity_stats', stdout=StringIO())
+        call_command('reconcile_activity_stats', '--fix', stdout=StringIO())
+
+        self.assertEqual(self.stats(), (1, 30, self.start))
+        self.assertEqual(reconcile_activity_stats(), [])
+
+    def test_user_without_records_is_not_drift(self):
+        create_record(self.user, self.start, 30).delete()
+        self.assertEqual(self.stats(), (0, 0, None))
+        self.assertEqual(reconcile_activity_stats(fix=True), [])
+        self.assertEqual(self.stats(), (0, 0, None))
+
+        # 記録がないのに残っている累計は0に戻す
+        UserActivityStats.objects.filter(user=self.user).update(session_count=3)
+        self.assertEqual(len(reconcile_activity_stats(fix=True)), 1)
+        self.assertEqual(self.stats(), (0, 0, None))
+
+    def test_friends_list_does_not_aggregate_per_friend(self):
+        self.client.force_login(self.user)
+        url = reverse('friend:friends_list')
+
+        def query_count():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            return response, len(context.captured_queries)
+
+        friends = [User.objects.create(username=f'friend{i}') for i in range(5)]
+        for i, friend in enumerate(friends):
+            Friend.objects.create(user1=self.user, user2=friend)
+            create_record(friend, self.start + timedelta(days=i % 3), 10)
+        query_count()  # キャッシュを温める
+
+        response, queries = query_count()
+        # セッションと UserActivityStats の1回ずつ
+        self.assertEqual(queries, 2)
+        self.assertContains(response, '運動1回・合計10分')
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='runner')
+        # 日曜日と、翌週の月曜日
+        self.sunday = timezone.make_aware(datetime(2026, 10, 18, 12))
+        self.monday = self.sunday + timedelta(days=1)
+
+    def rollups(self):
+        daily = DailyRollup.objects.filter(user=self.user).order_by('day')
+        weekly = WeeklyRollup.objects.filter(user=self.user).order_by('week_start')
+        return (
+            [(r.day, r.session_count, r.total_minutes) for r in daily],
+            [(r.week_start, r.session_count, r.total_minutes) for r in weekly],
+        )
+
+    def test_create_edit_and_delete(self):
+        first = create_record(self.user, self.sunday, 30)
+        create_record(self.user, self.sunday + timedelta(hours=2), 20)
+        self.assertEqual(self.rollups(), (
+            [(date(2026, 10, 18), 2, 50)],
+            [(date(2026, 10, 12), 2, 50)],
+        ))
+
+        # 読み込み直した記録の編集（翌週へ移動、時間も変更）は差分で反映される
+        first = ExerciseRecord.objects.get(pk=first.pk)
+        first.exercise_start_time = self.monday
+        first.duration_minutes = 40
+        first.save()
+        self.assertEqual(self.rollups(), (
+            [(date(2026, 10, 18), 1, 20), (date(2026, 10, 19), 1, 40)],
+            [(date(2026, 10, 12), 1, 20), (date(2026, 10, 19), 1, 40)],
+        ))
+
+        # 同じインスタンスをもう一度保存しても二重に数えない
+        first.save()
+        first.delete()
+        self.assertEqual(self.rollups(), (
+            [(date(2026, 10, 18), 1, 20), (date(2026, 10, 19), 0, 0)],
+            [(date(2026, 10, 12), 1, 20), (date(2026, 10, 19), 0, 0)],
+        ))
+
+    def test_diary_edit_does_not_touch_rollups(self):
+        record = create_record(self.user, self.sunday, 30)
+        record = ExerciseRecord.objects.get(pk=record.pk)
+        record.diary = '走った'
+        with CaptureQueriesContext(connection) as context:
+            record.save()
+        self.assertFalse([q for q in context.captured_queries if 'rollup' in q['sql'].lower()])
+
+    def test_import_matches_rebuild(self):
+        create_record(self.user, self.sunday, 30)
+        import_records([
+            (line, {
+                'exercise_start_time': start.isoformat(),
+                'exercise_end_time': (start + timedelta(minutes=15)).isoformat(),
+            })
+            for line, start in enumerate([self.sunday + timedelta(hours=1), self.monday], start=2)
+        ], user=self.user)
+        incremental = self.rollups()
+        self.assertEqual(incremental[1], [(date(2026, 10, 12), 2, 45), (date(2026, 10, 19), 1, 15)])
+
+        rebuild_rollups([self.user.pk])
+        self.assertEqual(self.rollups(), incremental)
+
+
+class HeatmapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='runner', time_zone='Asia/Tokyo')
+
+    def test_days_are_split_in_user_time_zone(self):
+        # UTCでは10/17だが、日本時間では10/18の1:30
+        create_record(self.user, datetime(2026, 10, 17, 16, 30, tzinfo=dt_timezone.utc), 40)
+        create_record(self.user, datetime(2026, 10, 18, 3, 0, tzinfo=dt_timezone.utc), 20)
+
+        minutes = compute_heatmap(self.user, date(2026, 10, 18))
+        self.assertEqual(len(minutes), HEATMAP_DAYS)
+        self.assertEqual(list(minutes[-2:]), [0, 60])
+
+    def test_index_links_the_heatmap_stylesheet(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'class="activity-heatmap"')
+        self.assertContains(response, 'stats/heatmap.css')
+
+    def test_streaks(self):
+        self.assertEqual(streaks(array('H', [5, 5, 5, 0, 5, 5, 0])), {'current': 2, 'longest': 3})
+        self.assertEqual(streaks(array('H', [5, 0, 5, 5])), {'current': 2, 'longest': 2})
+        self.assertEqual(streaks(array('H', [0, 0])), {'current': 0, 'longest': 0})
+
+    def test_json_is_cached_until_next_write_and_limited_to_friends(self):
+        self.client.force_login(self.user)
+        url = reverse('stats:heatmap')
+        self.assertEqual(self.client.get(url).json()['streak'], {'current': 0, 'longest': 0})
+
+        now = datetime.combine(user_today(self.user), datetime.min.time(), tzinfo=self.user.tzinfo())
+        with self.captureOnCommitCallbacks(execute=True):
+            create_record(self.user, now + timedelta(hours=1))
+        data = self.client.get(url).json()
+        self.assertEqual(data['minutes'][-1], 30)
+        self.assertEqual(data['streak'], {'current': 1, 'longest': 1})
+
+        friend = User.objects.create(username='friend')
+        stranger = User.objects.create(username='stranger')
+        Friend.objects.create(user1=self.user, user2=friend)
+        self.assertEqual(self.client.get(reverse('stats:friend_heatmap', args=[friend.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('stats:friend_heatmap', args=[stranger.pk])).status_code, 404)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='runner')
+        self.friend = User.objects.create(username='friend')
+        self.rival = User.objects.create(username='rival')
+        self.stranger = User.objects.create(username='stranger')
+        for other in (self.friend, self.rival):
+            Friend.objects.create(user1=self.user, user2=other)
+
+    def record(self, user, minutes):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_record(user, timezone.now(), minutes)
+
+    def ranking(self):
+        return [
+            (entry['rank'], entry['username'], entry['total_minutes'])
+            for entry in leaderboard.get_leaderboard(self.user, leaderboard.WEEK)
+        ]
+
+    def test_ties_share_a_rank_and_strangers_are_excluded(self):
+        self.record(self.friend, 30)
+        self.record(self.rival, 30)
+        self.record(self.stranger, 90)
+        self.assertEqual(self.ranking(), [(1, 'friend', 30), (1, 'rival', 30), (3, 'runner', 0)])
+
+    def test_cached_until_a_record_changes(self):
+        self.assertEqual(self.ranking()[0][2], 0)
+        with self.assertNumQueries(0):
+            self.ranking()
+
+        record = self.record(self.friend, 20)
+        self.assertEqual(self.ranking()[0], (1, 'friend', 20))
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delete()
+        self.assertEqual(self.ranking()[0][2], 0)
+
+    def test_update_during_recompute_is_not_cached_stale(self):
+        compute = leaderboard.compute_leaderboard
+
+        def racing_compute(*args):
+            # 古い集計を読んだ直後に、別のリクエストの更新がコミットされた状態
+            entries = compute(*args)
+            self.record(self.friend, 45)
+            return entries
+
+        with mock.patch.object(leaderboard, 'compute_leaderboard', side_effect=racing_compute):
+            self.assertEqual(self.ranking()[0][2], 0)
+        self.assertEqual(self.ranking()[0], (1, 'friend', 45))
+
+    def test_refresh_all_fills_the_cache(self):
+        self.record(self.rival, 15)
+        cache.clear()
+        self.assertEqual(leaderboard.refresh_all(leaderboard.WEEK, batch_size=2), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ranking()[0], (1, 'rival', 15))
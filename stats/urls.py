@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = "stats"
+
+urlpatterns = [
+    path("", views.stats_view, name="stats"),
+    path("leaderboard/", views.leaderboard_view, name="leaderboard"),
+    path("heatmap/", views.heatmap_view, name="heatmap"),
+    path("heatmap/<int:user_id>/", views.heatmap_view, name="friend_heatmap"),
+]
@@ -0,0 +1,89 @@
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+
+from accounts.models import User
+from friend.services import are_friends
+from .consts import MAX_STATS_DAYS, MAX_STATS_WEEKS
+from .heatmap import get_heatmap, streaks
+from .leaderboard import MONTH, WEEK, get_leaderboard, period_start
+from .models import WeeklyRollup
+from .services import daily_rows, weekly_rows
+
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        value = default
+    return max(1, min(value, maximum))
+
+
+@login_required
+def stats_view(request):
+    """
+    ログインユーザーの運動集計（JSON）
+    ?days=30&weeks=12
+    """
+    days = _int_param(request, 'days', 30, MAX_STATS_DAYS)
+    weeks = _int_param(request, 'weeks', 12, MAX_STATS_WEEKS)
+    today = timezone.localdate()
+
+    daily = daily_rows(request.user, days, today)
+    weekly = weekly_rows(request.user, weeks, today)
+    totals = WeeklyRollup.objects.filter(user=request.user).aggregate(
+        session_count=Sum('session_count'),
+        total_minutes=Sum('total_minutes'),
+    )
+
+    return JsonResponse({
+        'daily': [
+            {**row, 'day': row['day'].isoformat()} for row in daily
+        ],
+        'weekly': [
+            {**row, 'week_start': row['week_start'].isoformat()} for row in weekly
+        ],
+        'totals': {
+            'session_count': totals['session_count'] or 0,
+            'total_minutes': totals['total_minutes'] or 0,
+        },
+    })
+
+
+@login_required
+def leaderboard_view(request):
+    """
+    フレンド内の運動時間ランキング（週間・月間）
+    """
+    period = MONTH if request.GET.get('period') == MONTH else WEEK
+
+    return render(request, 'stats/leaderboard.html', {
+        'period': period,
+        'start': period_start(period),
+        'entries': get_leaderboard(request.user, period),
+    })
+
+
+@login_required
+def heatmap_view(request, user_id=None):
+    """
+    365日分の活動カレンダー（JSON）
+    自分の分、またはフレンドの分（user_id 指定）を返す
+    日付は対象ユーザーのタイムゾーンで区切る
+    """
+    user = request.user
+    if user_id is not None and user_id != request.user.pk:
+        user = get_object_or_404(User, pk=user_id)
+        if not are_friends(request.user, user):
+            raise Http404
+
+    start, minutes = get_heatmap(user)
+    return JsonResponse({
+        'user_id': user.pk,
+        'time_zone': user.time_zone,
+        'start': start.isoformat(),
+        'minutes': minutes.tolist(),
+        'streak': streaks(minutes),
+    })
@@ -0,0 +1,235 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts import cache as user_cache
+from accounts.models import User
+from exerciseRecord import urls as exercise_urls
+from exerciseRecord.models import ExerciseRecord
+from friend import urls as friend_urls
+from friend.models import Friend, FriendRequest
+from friend.services import friend_ids
+
+
+def _case(method='get', kwargs=None, data=None, content_type=None, setup=None):
+    """
+    setup: 毎回の計測の前に同じトランザクション内で呼ぶ関数（URLの引数を返す、計測後にロールバックされる）
+    """
+    return {'method': method, 'kwargs': kwargs or {}, 'data': data, 'content_type': content_type, 'setup': setup}
+
+
+def _update_user(user, **fields):
+    User.objects.filter(pk=user.pk).update(**fields)
+    user_cache.invalidate(user.pk)
+
+
+class Command(BaseCommand):
+    help = "exerciseRecord / friend の各URLをテストクライアントで叩き、p50/p95とSQL件数を計測する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="ログインするユーザー名（省略時はフレンドが最も多いユーザー）")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', '-o', help="結果を保存するJSONファイル")
+        parser.add_argument(
+            '--no-fragment-cache',
+            action='store_true',
+            help="テンプレート断片キャッシュを無効にして計測（有効時の結果と比べて描画時間の削減を確認する）",
+        )
+        parser.add_argument(
+            '--no-auth-cache',
+            action='store_true',
+            help="セッションをDBのみ・ログインユーザーのキャッシュなしで計測（リクエストごとのSQL件数の差を確認する）",
+        )
+
+    def handle(self, *args, user, iterations, output, no_fragment_cache, no_auth_cache, **options):
+        bench_user = self.pick_user(user)
+        cases = self.build_cases(bench_user)
+        results = []
+        overrides = {
+            # テストクライアントのホスト名（testserver）を許可する
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            # 計測用のキャッシュを使う（ロールバックした書き込みの内容・版の更新を本来のキャッシュに残さない）
+            'CACHES': {
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'bench_views',
+                },
+            },
+        }
+        if no_fragment_cache:
+            overrides['FRAGMENT_CACHE_TIMEOUT'] = 0
+        if no_auth_cache:
+            overrides['SESSION_ENGINE'] = 'django.contrib.sessions.backends.db'
+            overrides['USER_CACHE_TIMEOUT'] = 0
+        with override_settings(**overrides):
+            # セッションは計測する設定で作る
+            client = Client()
+            client.force_login(bench_user)
+            for namespace, patterns in (('', exercise_urls.urlpatterns), ('friend', friend_urls.urlpatterns)):
+                for pattern in patterns:
+                    name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+                    case = cases.get(name)
+                    if case is None:
+                        self.stderr.write(f"{name}: 計測条件がないためスキップしました")
+                        continue
+                    results.append(self.run_case(client, name, case, iterations))
+
+        self.stdout.write(f"{'URL名':<32}{'p50(ms)':>10}{'p95(ms)':>10}{'SQL':>6}{'status':>8}")
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<32}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                f"{result['queries']:>6}{result['status']:>8}"
+            )
+
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'timestamp': timezone.now().isoformat(),
+                    'user': bench_user.username,
+                    'iterations': iterations,
+                    'fragment_cache': not no_fragment_cache,
+                    'auth_cache': not no_auth_cache,
+                    'counts': {
+                        'users': User.objects.count(),
+                        'friends': Friend.objects.count(),
+                        'friend_requests': FriendRequest.objects.count(),
+                        'exercise_records': ExerciseRecord.objects.count(),
+                    },
+                    'results': results,
+                }, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"{output} に保存しました"))
+
+    def pick_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.annotate(friend_count=Count('friend_links')).order_by('-friend_count').first()
+        if user is None:
+            raise CommandError("ユーザーがいません。先に seed_load を実行してください")
+        return user
+
+    def build_cases(self, user):
+        """
+        URL名ごとの計測条件（書き込み系は計測後にロールバックする）
+        申請・記録がない場合は setup で作ってから計測する（404 を計測しないように）
+        """
+        record = ExerciseRecord.objects.filter(user=user).order_by('-created_at').first()
+        friendship = Friend.objects.filter(links__user=user).first()
+        # 申請のやり取りがないフレンド以外のユーザー
+        stranger = (
+            User.objects
+            .exclude(pk__in=friend_ids(user) + [user.pk])
+            .exclude(sent_requests__to_user=user)
+            .exclude(received_requests__from_user=user)
+            .first()
+        )
+        started = timezone.now() - timedelta(minutes=30)
+        import_body = (
+            "exercise_start_time,exercise_end_time,diary\n"
+            f"{started.isoformat()},{timezone.now().isoformat()},bench\n"
+        )
+        sync_body = json.dumps({'sessions': [{
+            'exercise_start_time': (started - timedelta(days=1)).isoformat(),
+            'exercise_end_time': (timezone.now() - timedelta(days=1)).isoformat(),
+        }]})
+
+        def received_request():
+            pending = FriendRequest.objects.filter(to_user=user).first()
+            if pending is None:
+                pending = FriendRequest.objects.create(from_user=stranger, to_user=user)
+            return {'request_id': pending.pk}
+
+        def sent_request():
+            pending = FriendRequest.objects.filter(from_user=user).first()
+            if pending is None:
+                pending = FriendRequest.objects.create(from_user=user, to_user=stranger)
+            return {'request_id': pending.pk}
+
+        def own_record():
+            target = record or ExerciseRecord.objects.create(
+                user=user, exercise_start_time=started, exercise_end_time=timezone.now(), duration_minutes=30,
+            )
+            return {'pk': target.pk}
+
+        return {
+            'index': _case(),
+            'exercise_records_json': _case(),
+            'post_exercise': _case(setup=own_record),
+            'exercising': _case(),
+            'session_state_json': _case(),
+            'start_session_json': _case('post', setup=lambda: _update_user(user, last_exercise_time=None)),
+            'stop_session_json': _case('post', setup=lambda: _update_user(user, last_exercise_time=started)),
+            'sync_sessions_json': _case('post', data=sync_body, content_type='application/json'),
+            'export_exercise_records': _case(),
+            'import_exercise_records': _case('post', data=import_body, content_type='text/csv'),
+            'diary_search': _case(data={'q': 'ランニング'}),
+            'friends_exercise_records': _case(),
+            'friend:user_search': _case(data={'q': user.username[:3]}),
+            'friend:suggestions': _case(),
+            'friend:friends_list': _case(),
+            'friend:friend_requests': _case(),
+            'friend:sent_requests': _case(),
+            'friend:accept_request': _case('post', setup=received_request),
+            'friend:reject_request': _case('post', setup=received_request),
+            'friend:send_friend_request': _case('post', kwargs={'user_id': stranger.pk if stranger else 0}),
+            'friend:cancel_friend_request': _case('post', setup=sent_request),
+            'friend:remove_friend': _case('post', kwargs={'friend_id': friendship.pk if friendship else 0}),
+            # スタッフ専用なので計測中だけスタッフにする
+            'friend:cache_stats': _case(setup=lambda: _update_user(user, is_staff=True)),
+        }
+
+    def request(self, client, url, case):
+        extra = {'HTTP_REFERER': url}
+        if case['method'] == 'post':
+            if case['content_type']:
+                return client.post(url, case['data'], content_type=case['content_type'], **extra)
+            return client.post(url, case['data'] or {}, **extra)
+        return client.get(url, case['data'] or {}, **extra)
+
+    def run_case(self, client, name, case, iterations):
+        timings = []
+        queries = 0
+        status = None
+        for _ in range(iterations + 1):  # 1回目はウォームアップ
+            with transaction.atomic():
+                kwargs = dict(case['kwargs'])
+                if case['setup']:
+                    kwargs.update(case['setup']() or {})
+                url = reverse(name, kwargs=kwargs)
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = self.request(client, url, case)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                # 書き込み系のURLでもデータが変わらないように戻す
+                transaction.set_rollback(True)
+            if case['method'] == 'post' or case['setup']:
+                # ロールバックした内容がキャッシュに残らないようにする（次の計測はキャッシュなしから）
+                cache.clear()
+            timings.append(elapsed * 1000)
+            queries = len(context.captured_queries)
+            status = response.status_code
+        timings = timings[1:]
+
+        return {
+            'name': name,
+            'method': case['method'].upper(),
+            'path': url,
+            'status': status,
+            'queries': queries,
+            'p50_ms': statistics.median(timings),
+            'p95_ms': statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0],
+            'mean_ms': statistics.fmean(timings),
+        }
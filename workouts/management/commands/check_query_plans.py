@@ -0,0 +1,84 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.models import User
+from accounts.search import CONTAINS
+from exerciseRecord.consts import ITEM_PER_PAGE
+from exerciseRecord.export import export_queryset
+from exerciseRecord.pagination import NEWER, OLDER, page_queryset
+from exerciseRecord.services import own_records
+from feed.consts import FEED_ITEMS
+from feed.services import entries_since, latest_entries
+from friend.models import FriendLink
+from friend.services import (
+    friends_of, friendships_of, received_requests, search_candidates, sent_requests,
+)
+from friend.suggestions import suggestions_for
+from stats.consts import HEATMAP_DAYS
+from stats.heatmap import heatmap_rows
+from stats.leaderboard import MONTH, WEEK, period_rows, period_start
+from stats.services import daily_rows, weekly_rows
+
+# インデックスを使わない全件走査（SCAN テーブル名 のみの行）
+FULL_SCAN = re.compile(r"\bSCAN (\w+)\s*$")
+
+
+def hot_queries(user):
+    """
+    ビューが使っているのと同じ関数で組み立てたqueryset
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    position = (now, 1)
+    return [
+        ('index: 自分の運動記録', page_queryset(own_records(user), None, OLDER, ITEM_PER_PAGE)),
+        ('index: 古いページ', page_queryset(own_records(user), position, OLDER, ITEM_PER_PAGE)),
+        ('index: 新しいページ', page_queryset(own_records(user), position, NEWER, ITEM_PER_PAGE)),
+        ('export: 運動記録', export_queryset([user.pk])),
+        ('feed: タイムライン', latest_entries(user, FEED_ITEMS)),
+        ('feed: 差分', entries_since(user, position, FEED_ITEMS)),
+        # are_friends / friend_ids は評価済みの値を返すので同じ条件のquerysetで確認する
+        ('friend: are_friends', FriendLink.objects.filter(user=user, friend_id=user.pk + 1)),
+        ('friend: friend_ids', FriendLink.objects.filter(user=user).values_list('friend_id', flat=True)),
+        ('friend: friends_of', friends_of(user)),
+        ('friend: friendships_of', friendships_of(user).filter(id=1)),
+        ('friend: 受け取った申請', received_requests(user)),
+        ('friend: 送った申請', sent_requests(user)),
+        ('friend: ユーザー検索', search_candidates(user, 'runner', CONTAINS)[:20]),
+        ('friend: 知り合いかも', suggestions_for(user)),
+        ('stats: 日次集計', daily_rows(user, 30, today)),
+        ('stats: 週次集計', weekly_rows(user, 12, today)),
+        ('stats: ヒートマップ', heatmap_rows(user, today - timedelta(days=HEATMAP_DAYS - 1))),
+        ('stats: 週間ランキング', period_rows(WEEK, period_start(WEEK), [user.pk])),
+        ('stats: 月間ランキング', period_rows(MONTH, period_start(MONTH), [user.pk])),
+    ]
+
+
+class Command(BaseCommand):
+    help = "主要なクエリの EXPLAIN QUERY PLAN を確認し、全件走査があれば失敗する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="全クエリの実行計画を表示")
+
+    def handle(self, *args, verbose_plans, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("EXPLAIN QUERY PLAN の確認はSQLiteのみ対応しています")
+
+        # 実在しなくてもよい（IDで絞り込むだけなので実行計画は同じ）
+        user = User(pk=1, username='explain')
+        failures = []
+        for name, queryset in hot_queries(user):
+            plan = queryset.explain()
+            scans = [line for line in plan.splitlines() if FULL_SCAN.search(line)]
+            if scans or verbose_plans:
+                self.stdout.write(f"== {name}\n{plan}")
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError("全件走査しているクエリがあります: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("全てのクエリがインデックスを使っています"))
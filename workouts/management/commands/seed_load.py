@@ -0,0 +1,155 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import User
+from exerciseRecord.models import ExerciseRecord
+from feed.services import rebuild_timeline
+from friend.models import Friend, FriendLink, FriendRequest
+from stats.services import rebuild_rollups, reconcile_activity_stats
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "負荷試験用のユーザー・フレンド・申請・運動記録を bulk_create で作成する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--avg-friends', type=float, default=10, help="フレンド数の平均（べき分布）")
+        parser.add_argument('--requests', type=int, default=None, help="保留中のフレンド申請の件数（省略時はユーザー数）")
+        parser.add_argument('--records', type=float, default=30, help="1人あたりの運動記録数の平均")
+        parser.add_argument('--days', type=int, default=365, help="運動記録を散らばらせる過去の日数")
+        parser.add_argument('--prefix', default='load', help="作成するユーザー名の接頭辞")
+        parser.add_argument('--password', default='password', help="全ユーザー共通のパスワード")
+        parser.add_argument('--seed', type=int, default=None, help="乱数のシード")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_ids = self.create_users(options)
+        self.stdout.write(f"ユーザー: {len(user_ids)}人")
+
+        friends = self.create_friends(rng, user_ids, options['avg_friends'])
+        self.stdout.write(f"フレンド関係: {len(friends)}件")
+
+        requests = options['requests']
+        requests = self.create_requests(rng, user_ids, friends, len(user_ids) if requests is None else requests)
+        self.stdout.write(f"フレンド申請: {requests}件")
+
+        records = self.create_records(rng, user_ids, options['records'], options['days'])
+        # auto_now_add で全件が現在時刻になるので、終了時刻に合わせる
+        ExerciseRecord.objects.filter(user_id__in=user_ids).update(created_at=F('exercise_end_time'))
+        self.stdout.write(f"運動記録: {records}件")
+
+        # bulk_create ではシグナルが送られないため、派生データはまとめて作り直す
+        rebuild_rollups(user_ids)
+        reconcile_activity_stats(user_ids, fix=True)
+        for user_id in user_ids:
+            with transaction.atomic():
+                rebuild_timeline(user_id)
+        self.stdout.write(self.style.SUCCESS("集計とタイムラインを作り直しました"))
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(options['password'])
+        users = [
+            User(username=f"{prefix}{start + i}", password=password)
+            for i in range(options['users'])
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        return list(
+            User.objects
+            .filter(username__in=[user.username for user in users])
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def create_friends(self, rng, user_ids, avg_friends):
+        """
+        パレート分布で各ユーザーのフレンド数の重みを決め、重みに比例して相手を選ぶ
+        （少数のユーザーに多くのフレンドが集まる）
+        """
+        if len(user_ids) < 2:
+            return set()
+        weights = [rng.paretovariate(1.5) for _ in user_ids]
+        target = int(len(user_ids) * avg_friends / 2)
+        pairs = set()
+        attempts = 0
+        while len(pairs) < target and attempts < target * 5:
+            attempts += 1
+            a, b = rng.choices(user_ids, weights=weights, k=2)
+            if a != b:
+                pairs.add((min(a, b), max(a, b)))
+
+        now = timezone.now()
+        with transaction.atomic():
+            friendships = Friend.objects.bulk_create(
+                [Friend(user1_id=a, user2_id=b) for a, b in pairs],
+                batch_size=BATCH_SIZE,
+            )
+            links = []
+            for friendship in friendships:
+                for user_id, friend_id in (
+                    (friendship.user1_id, friendship.user2_id),
+                    (friendship.user2_id, friendship.user1_id),
+                ):
+                    links.append(FriendLink(
+                        user_id=user_id,
+                        friend_id=friend_id,
+                        friendship_id=friendship.pk,
+                        created_at=friendship.created_at or now,
+                    ))
+            FriendLink.objects.bulk_create(links, batch_size=BATCH_SIZE)
+        return pairs
+
+    def create_requests(self, rng, user_ids, friends, count):
+        if len(user_ids) < 2:
+            return 0
+        pairs = set()
+        attempts = 0
+        while len(pairs) < count and attempts < count * 5:
+            attempts += 1
+            a, b = rng.sample(user_ids, 2)
+            key = (min(a, b), max(a, b))
+            if key in friends or (b, a) in pairs:
+                continue
+            pairs.add((a, b))
+        FriendRequest.objects.bulk_create(
+            [FriendRequest(from_user_id=a, to_user_id=b) for a, b in pairs],
+            batch_size=BATCH_SIZE,
+        )
+        return len(pairs)
+
+    def create_records(self, rng, user_ids, avg_records, days):
+        now = timezone.now()
+        total = 0
+        batch = []
+        for user_id in user_ids:
+            # 記録数もユーザーごとに偏らせる（平均 avg_records）
+            count = int(rng.expovariate(1 / avg_records)) if avg_records > 0 else 0
+            starts = set()
+            for _ in range(count):
+                starts.add(now - timedelta(days=rng.uniform(0, days)))
+            for start in starts:
+                duration = rng.randint(10, 120)
+                batch.append(ExerciseRecord(
+                    user_id=user_id,
+                    exercise_start_time=start,
+                    exercise_end_time=start + timedelta(minutes=duration),
+                    duration_minutes=duration,
+                    diary=rng.choice(['', 'ランニング', '筋トレ', 'ヨガ', '川沿いを走った']),
+                ))
+            if len(batch) >= BATCH_SIZE:
+                ExerciseRecord.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                total += len(batch)
+                batch = []
+        if batch:
+            ExerciseRecord.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            total += len(batch)
+        return total
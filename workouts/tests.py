@@ -1,3 +1,35 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from config.middleware import QueryBudgetExceeded
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        # 全件走査するクエリがあれば CommandError になる
+        call_command('check_query_plans', stdout=StringIO())
+
+
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='runner'))
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('session_state_json'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+    @override_settings(QUERY_BUDGETS={'session_state_json': 0})
+    def test_budget_exceeded_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('session_state_json'))
+
+    @override_settings(QUERY_BUDGETS={'export_exercise_records': 1})
+    def test_streaming_body_queries_are_counted(self):
+        # ヘッダーまでは1件以内でも、本文を作る時のSQLも数える
+        response = self.client.get(reverse('export_exercise_records'))
+        with self.assertRaises(QueryBudgetExceeded):
+            b''.join(response.streaming_content)
@@ -5,4 +5,6 @@ urlpatterns = [
     path('', include("exerciseRecord.urls")),
     path('accounts/', include("accounts.urls")),
     path('friend/', include("friend.urls")),
+    path('stats/', include("stats.urls")),
+    path('feed/', include("feed.urls")),
 ]
\ No newline at end of file